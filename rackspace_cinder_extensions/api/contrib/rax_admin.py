@@ -14,6 +14,9 @@
 
 # flake8: noqa
 
+import copy
+import datetime
+
 try:
     from oslo_config import cfg
 except ImportError:
@@ -35,16 +38,52 @@ from cinder.api import extensions
 from cinder.i18n import _
 from cinder.quota import QUOTAS
 from cinder.volume.driver import VolumeDriver
+from oslo_utils import strutils
+from oslo_utils import timeutils
 from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import literal_column
+from sqlalchemy import or_
+import eventlet
 import lunrclient
 from lunrclient import client
+from lunrclient.base import LunrError, LunrHttpError
 from lunrclient.client import LunrClient
 import requests
+import webob
 from webob import exc
 
+from rackspace_cinder_extensions.common import admission
+from rackspace_cinder_extensions.common import clusters
+from rackspace_cinder_extensions.common import evacuation
+from rackspace_cinder_extensions.common import health
+from rackspace_cinder_extensions.common import inventory
+from rackspace_cinder_extensions.common import jobs
+from rackspace_cinder_extensions.common import memo
+from rackspace_cinder_extensions.common import profiler
+from rackspace_cinder_extensions.common import records
+from rackspace_cinder_extensions.common import retry
+from rackspace_cinder_extensions.common import topology
+
 
 lunr_opts = [
     cfg.StrOpt('lunr_api_version', default='v1.0'),
+    cfg.IntOpt('rax_admin_list_max_limit',
+               default=1000,
+               help='Largest page returned by the paginated rax-admin list '
+                    'actions'),
+    cfg.IntOpt('rax_admin_get_volumes_list_threshold',
+               default=20,
+               help='Above this many ids the rax-admin get-volumes action '
+                    'lists every volume of each Lunr cluster once, instead '
+                    'of getting the volumes one by one'),
+    cfg.IntOpt('rax_quota_changes_safety_lag',
+               default=60,
+               help='Seconds the watermark of rax-admin quota-usage-changes '
+                    'stays behind the time of the query, so rows written by '
+                    'transactions that commit late are not skipped'),
 ]
 
 CONF = cfg.CONF
@@ -52,6 +91,8 @@ CONF.register_opts(lunr_opts)
 
 LOG = logging.getLogger(__name__)
 authorize_quota_usage = extensions.extension_authorizer('rax-admin', 'quota-usage')
+authorize_quota_usage_changes = extensions.extension_authorizer('rax-admin', 'quota-usage-changes')
+authorize_quota_summary = extensions.extension_authorizer('rax-admin', 'quota-summary')
 authorize_top_usage = extensions.extension_authorizer('rax-admin', 'top-usage')
 authorize_list_nodes = extensions.extension_authorizer('rax-admin', 'list-nodes')
 authorize_list_nodes_out_rotation = extensions.extension_authorizer('rax-admin', 'list-nodes-out-rotation')
@@ -59,8 +100,18 @@ authorize_list_volumes = extensions.extension_authorizer('rax-admin', 'list-volu
 authorize_list_lunr_volumes = extensions.extension_authorizer('rax-admin', 'list-lunr-volumes')
 authorize_get_node = extensions.extension_authorizer('rax-admin', 'get-node')
 authorize_get_volume = extensions.extension_authorizer('rax-admin', 'get-volume')
+authorize_get_volumes = extensions.extension_authorizer('rax-admin', 'get-volumes')
 authorize_status_volumes_all = extensions.extension_authorizer('rax-admin', 'status-volumes-all')
 authorize_update_node = extensions.extension_authorizer('rax-admin', 'update_node')
+authorize_evacuate_node = extensions.extension_authorizer('rax-admin', 'evacuate-node')
+authorize_evacuate_node_status = extensions.extension_authorizer('rax-admin', 'evacuate-node-status')
+authorize_admission_stats = extensions.extension_authorizer('rax-admin', 'admission-stats')
+authorize_job_status = extensions.extension_authorizer('rax-admin', 'job-status')
+authorize_job_result = extensions.extension_authorizer('rax-admin', 'job-result')
+authorize_lunr_stats = extensions.extension_authorizer('rax-admin', 'lunr-stats')
+authorize_list_sessions = extensions.extension_authorizer('rax-admin', 'list-sessions')
+authorize_list_backups = extensions.extension_authorizer('rax-admin', 'list-backups')
+authorize_export_inventory = extensions.extension_authorizer('rax-admin', 'export-inventory')
 
 
 class SafeDict(dict):
@@ -71,8 +122,11 @@ class SafeDict(dict):
         value = dict.get(self, key, default)
         if value is None:
             value = default
-        if isinstance(value, dict):
-            return SafeDict(value)
+        if isinstance(value, dict) and not isinstance(value, SafeDict):
+            value = SafeDict(value)
+            if key in self:
+                # wrap a nested dict once, not on every read
+                dict.__setitem__(self, key, value)
         return value
 
 
@@ -89,7 +143,28 @@ class RaxAdminController(wsgi.Controller):
     def __init__(self, *args, **kwargs):
         super(RaxAdminController, self).__init__(*args, **kwargs)
 
+    def _submit_job(self, req, name, action, body):
+        """
+        Runs a report action in the background instead of inside the
+        request. The job shares the request context but skips admission
+        control, the size of the job pool already bounds it.
+        :return: {"job": {<job-status data>}}
+        """
+        job_body = copy.deepcopy(body)
+        del job_body[name]['async']
+        job_req = req.copy()
+        job_req.environ[admission.ENVIRON_KEY] = 'job'
+        try:
+            job = jobs.submit(name, lambda: action(job_req, body=job_body))
+        except jobs.PoolFull:
+            raise exc.HTTPTooManyRequests(
+                explanation=_("Too many asynchronous reports running"),
+                headers={'Retry-After': str(CONF.rax_admin_retry_after)})
+        return dict(job=job_view(job))
+
     @wsgi.action('quota-usage')
+    @admission.limited('quota-usage')
+    @profiler.profiled('quota-usage')
     def _quota_usage(self, req, body):
         """
         Return a list of all quotas in the db and how
@@ -99,6 +174,9 @@ class RaxAdminController(wsgi.Controller):
         context = req.environ['cinder.context']
         # Verify the user accessing this resource is allowed?
         authorize_quota_usage(context)
+        if SafeDict(body).get('quota-usage', {}).get('async'):
+            return self._submit_job(req, 'quota-usage', self._quota_usage,
+                                    body)
         rows = model_query(context, models.Quota, models.QuotaUsage,
                            read_deleted="no").\
             filter(models.QuotaUsage.project_id == models.Quota.project_id).\
@@ -109,7 +187,165 @@ class RaxAdminController(wsgi.Controller):
                   for quota, usage in rows]
         return dict(quotas=result)
 
+    @wsgi.action('quota-usage-changes')
+    @admission.limited('quota-usage-changes')
+    @profiler.profiled('quota-usage-changes')
+    def _quota_usage_changes(self, req, body):
+        """
+        Return the Quota and QuotaUsage rows created, updated or deleted
+        since a watermark, and the watermark to pass on the next call.
+        The watermark is the time of the query less
+        rax_quota_changes_safety_lag, whatever rows were read, so a row
+        whose transaction commits after a later one was read isn't missed.
+        Rows changed after the watermark are returned again on the next
+        call, so consumers should upsert. Without since, every live row
+        is returned.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"quota-usage-changes": {"since": "<ISO 8601 time>"}}
+        :return: {"quotas": [{"project_id": "<id>", "resource": "<name>",
+                              "hard_limit": <limit>, "deleted": <bool>,
+                              "changed_at": "<time>"}, ...],
+                  "quota_usages": [{"project_id": "<id>",
+                                    "resource": "<name>", "in_use": <count>,
+                                    "reserved": <count>, "deleted": <bool>,
+                                    "changed_at": "<time>"}, ...],
+                  "watermark": "<ISO 8601 time>"}
+        """
+        context = req.environ['cinder.context']
+        authorize_quota_usage_changes(context)
+        since = SafeDict(body).get('quota-usage-changes', {}).get('since')
+        if since:
+            try:
+                since = timeutils.normalize_time(
+                    timeutils.parse_isotime(since))
+            except (TypeError, ValueError):
+                raise exc.HTTPBadRequest(
+                    explanation=_("since must be an ISO 8601 time"))
+        watermark = timeutils.utcnow() - datetime.timedelta(
+            seconds=CONF.rax_quota_changes_safety_lag)
+        if since and since > watermark:
+            watermark = since
+
+        def changed(model):
+            if not since:
+                return model_query(context, model, read_deleted="no").all()
+            return model_query(context, model, read_deleted="yes").\
+                filter(or_(model.created_at >= since,
+                           model.updated_at >= since,
+                           model.deleted_at >= since)).all()
+
+        def changed_at(row):
+            return max(t for t in (row.created_at, row.updated_at,
+                                   row.deleted_at) if t is not None)
+
+        quotas = []
+        for quota in changed(models.Quota):
+            quotas.append({'project_id': quota.project_id,
+                           'resource': quota.resource,
+                           'hard_limit': quota.hard_limit,
+                           'deleted': bool(quota.deleted),
+                           'changed_at': changed_at(quota).isoformat()})
+        usages = []
+        for usage in changed(models.QuotaUsage):
+            usages.append({'project_id': usage.project_id,
+                           'resource': usage.resource,
+                           'in_use': usage.in_use,
+                           'reserved': usage.reserved,
+                           'deleted': bool(usage.deleted),
+                           'changed_at': changed_at(usage).isoformat()})
+        return dict(quotas=quotas, quota_usages=usages,
+                    watermark=watermark.isoformat())
+
+    @wsgi.action('quota-summary')
+    @admission.limited('quota-summary')
+    @profiler.profiled('quota-summary')
+    def _quota_summary(self, req, body):
+        """
+        Return fleet wide quota totals and utilization, computed in the
+        database. Projects without a Quota row use the defaults, unlimited
+        (-1) limits are counted apart and left out of the utilization.
+        Histogram bucket i counts projects using [i/buckets, (i+1)/buckets)
+        of their limit, the extra last bucket those at or over it.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"quota-summary": {"thresholds": [0.8, 0.9, 1.0],
+                                       "buckets": 10}}
+        :return: {"resources": {"<resource>": {
+                        "in_use": <total>, "hard_limit": <total>,
+                        "projects": <count>, "unlimited": <count>,
+                        "above": {"<threshold>": <count>, ...},
+                        "histogram": [<count>, ...]}, ...}}
+        """
+        context = req.environ['cinder.context']
+        authorize_quota_summary(context)
+        kwargs = SafeDict(body).get('quota-summary', {})
+        try:
+            thresholds = [float(t) for t in
+                          kwargs.get('thresholds', [0.8, 0.9, 1.0])]
+            buckets = int(kwargs.get('buckets', 10))
+        except (TypeError, ValueError):
+            raise exc.HTTPBadRequest(
+                explanation=_("thresholds must be numbers and buckets an "
+                              "integer"))
+        if not 1 <= buckets <= 100:
+            raise exc.HTTPBadRequest(
+                explanation=_("buckets must be between 1 and 100"))
+        defaults = QUOTAS.get_defaults(context)
+        usage = models.QuotaUsage
+        quota = models.Quota
+        if defaults:
+            default_limit = case([(usage.resource == resource, limit)
+                                  for resource, limit in defaults.items()],
+                                 else_=-1)
+        else:
+            default_limit = literal(-1)
+        hard_limit = func.coalesce(quota.hard_limit, default_limit)
+        limited = hard_limit > 0
+        join = and_(usage.project_id == quota.project_id,
+                    usage.resource == quota.resource,
+                    quota.deleted == False)
+
+        columns = [usage.resource,
+                   func.sum(usage.in_use),
+                   func.sum(case([(hard_limit > 0, hard_limit)], else_=0)),
+                   func.count(usage.id),
+                   func.sum(case([(hard_limit < 0, 1)], else_=0))]
+        columns.extend(func.sum(case([(and_(limited, usage.in_use >=
+                                            literal(t) * hard_limit), 1)],
+                                     else_=0))
+                       for t in thresholds)
+        totals = model_query(context, *columns, read_deleted="no").\
+            outerjoin(quota, join).group_by(usage.resource).all()
+
+        bucket = case([(usage.in_use * buckets < hard_limit * (i + 1), i)
+                       for i in range(buckets)], else_=buckets)
+        # group by the label, the repeated expression would get its own
+        # bind parameters and not match the selected one on PostgreSQL
+        histogram = model_query(context, usage.resource,
+                                bucket.label('bucket'),
+                                func.count(usage.id), read_deleted="no").\
+            outerjoin(quota, join).filter(limited).\
+            group_by(usage.resource, literal_column('bucket')).all()
+
+        resources = {}
+        for row in totals:
+            resource, in_use, limit, projects, unlimited = row[:5]
+            resources[resource] = {
+                'in_use': int(in_use or 0),
+                'hard_limit': int(limit or 0),
+                'projects': int(projects),
+                'unlimited': int(unlimited or 0),
+                'above': dict((str(t), int(count or 0)) for t, count
+                              in zip(thresholds, row[5:])),
+                'histogram': [0] * (buckets + 1)}
+        for resource, index, count in histogram:
+            resources[resource]['histogram'][int(index)] = int(count)
+        return dict(resources=resources)
+
     @wsgi.action('top-usage')
+    @admission.limited('top-usage')
+    @profiler.profiled('top-usage')
     def _top_usage(self, req, body):
         """
         Return a list of project_id's with the most usage
@@ -127,6 +363,8 @@ class RaxAdminController(wsgi.Controller):
         context = req.environ['cinder.context']
         # Verify the user accessing this resource is allowed?
         authorize_top_usage(context)
+        if SafeDict(body).get('top-usage', {}).get('async'):
+            return self._submit_job(req, 'top-usage', self._top_usage, body)
         # Get all the quota defaults
         default_quotas = QUOTAS.get_defaults(context)
         # Fetch the projects with the most usage
@@ -152,6 +390,8 @@ class RaxAdminController(wsgi.Controller):
         return dict(quotas=result)
 
     @wsgi.action('get-node')
+    @admission.limited('get-node')
+    @profiler.profiled('get-node')
     def _get_node(self, req, body):
         """
         Returns Lunr node information for a specific node
@@ -164,18 +404,22 @@ class RaxAdminController(wsgi.Controller):
         authorize_get_node(cinder_context)
         node_id = str(SafeDict(body).get('get-node', {}).get('id'))
         tenant_id = 'admin'
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
+        lunr_client = memo.lunr_client(req, tenant_id)
         node = lunr_except_handler(lambda: lunr_client.nodes.get(node_id))
         return dict(node=node)
 
     @wsgi.action('get-volume')
+    @admission.limited('get-volume')
+    @profiler.profiled('get-volume')
     def _get_volume(self, req, body):
         """
         Returns Lunr, Cinder, and storage node GET data for a volume
         :param req: python-cinderclient request
         :param body: python-cinderclinet request's body
-                   {"get-volume": {"id": "<volume_id>"}}
-        :return: {"volume": {"storage_volumes": {<storage_volumes vol 1>},
+                   {"get-volume": {"id": "<volume_id>", "cluster": "<cluster>"}}
+                   Without a cluster every Lunr cluster is asked for the volume
+        :return: {"volume": {"cluster": "<cluster>",
+                             "storage_volumes": {<storage_volumes vol 1>},
                              "storage_backups": [{<storage_backups backup 1>}, {backup 2}, ...],
                              "storage_exports": [{<storage_exports export 1>}, {export 2 ?}, ...],
                              "lunr_nodes": {<lunr_nodes data>},
@@ -186,23 +430,36 @@ class RaxAdminController(wsgi.Controller):
         """
         cinder_context = req.environ['cinder.context']
         authorize_get_volume(cinder_context)
-        volume_id = str(SafeDict(body).get('get-volume', {}).get('id'))
-        volume = {}
-        lunr_backups = []
+        kwargs = SafeDict(body).get('get-volume', {})
+        volume_id = str(kwargs.get('id'))
         tenant_id = 'admin'
+        # Find the Lunr cluster the volume lives in
+        cluster = kwargs.get('cluster')
+        if cluster is None:
+            found, errors = clusters.fan_out(req, lambda client: client.volumes.get(volume_id), tenant_id)
+            if not found:
+                raise exc.HTTPNotFound(
+                    explanation=_("Volume %(id)s not found in any Lunr cluster: %(errors)s")
+                    % {'id': volume_id, 'errors': errors})
+            cluster = found[0][0]
+        try:
+            lunr_client = clusters.lunr_client(req, cluster, tenant_id)
+        except KeyError:
+            raise exc.HTTPBadRequest(
+                explanation=_("Unknown Lunr cluster %s") % cluster)
+        volume = {'cluster': cluster}
         # Get Lunr specific data for volume
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
         lunr_volumes = lunr_except_handler(lambda: lunr_client.volumes.get(volume_id))
         lunr_exports = lunr_except_handler(lambda: lunr_client.exports.get(volume_id))
         # Get Lunr node id information for direct storage node query
-        lunr_nodes = lunr_except_handler(lambda: lunr_client.nodes.get(lunr_volumes['node_id']))
+        lunr_nodes = lunr_except_handler(lambda: memo.cached_node(lunr_client, lunr_volumes['node_id']))
         volume.update(dict(lunr_volumes=lunr_volumes))
         if lunr_exports['code'] == 200:
             volume.update(dict(lunr_exports=[lunr_exports]))
         volume.update(dict(lunr_nodes=lunr_nodes))
         # Get volume data specific to the storage node resource (direct from storage node)
         url = 'http://%s:%s' % (lunr_nodes['hostname'], str(lunr_nodes['port']))
-        storage_client = lunrclient.client.StorageClient(url)
+        storage_client = memo.storage_client(req, url)
         storage_volumes = lunr_except_handler(lambda: storage_client.volumes.get(volume_id))
         storage_exports = lunr_except_handler(lambda: storage_client.exports.get(volume_id))
         storage_backups = lunr_except_handler(lambda: storage_client.backups.list(volume_id))
@@ -211,44 +468,186 @@ class RaxAdminController(wsgi.Controller):
         if storage_exports['code'] == 200:
             volume.update(dict(storage_exports=[storage_exports]))
         volume.update(dict(storage_backups=[storage_backups]))
-        # Now that storage_backup list has been identified
-        # Lunr can be queried specifically for each backup
-        # *** Should actually use lunr backups and query by kwargs
-        # that contain account_id and volume id
-        if len(storage_backups) > 1:
-            for k, v in storage_backups.iteritems():
-                if k != 'code':
-                    lunr_backups.append(lunr_except_handler(lambda: lunr_client.backups.get(k)))
-            volume.update(dict(lunr_backups=lunr_backups))
-        else:
-            # storage_backup only had a 404 error code
-            # No backups to iterate over.
-            volume.update(dict(lunr_backups=[]))
+        # One filtered Lunr backup list instead of a get per storage backup
+        lunr_backups = list_lunr_backups(lunr_client, {'volume_id': volume_id})
+        volume.update(dict(lunr_backups=lunr_backups))
         # Now add cinder volume data to the volume dictionary
         volume.update({"cinder_volumes": volume_get(cinder_context, volume_id)})
         return dict(volume=volume)
 
+    @wsgi.action('get-volumes')
+    @admission.limited('get-volumes')
+    @profiler.profiled('get-volumes')
+    def _get_volumes(self, req, body):
+        """
+        Returns the get-volume data of many volumes. The volumes are
+        resolved to their nodes with a Lunr volume get per id and cluster,
+        or one volume list per cluster above
+        rax_admin_get_volumes_list_threshold ids, the Cinder rows are
+        loaded with one query, and the volumes of each storage node are
+        listed once, the nodes in parallel. Lunr and storage node have no
+        bulk calls for exports and backups, those are still fetched per
+        volume. A volume not found in any cluster, or on a storage node
+        that can't be reached, is reported in the errors.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                   {"get-volumes": {"ids": ["<volume_id>", ...]}}
+        :return: {"count": <count>,
+                  "volumes": [{<get-volume data>}, ...],
+                  "not_found": ["<volume_id>", ...],
+                  "errors": {"<cluster or volume_id>": {"code": <code>,
+                                                        "message": <message>}}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_get_volumes(cinder_context)
+        ids = SafeDict(body).get('get-volumes', {}).get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise exc.HTTPBadRequest(
+                explanation=_("ids must be a non empty list of volume ids"))
+        if len(ids) > CONF.rax_admin_list_max_limit:
+            raise exc.HTTPBadRequest(
+                explanation=_("At most %d volumes per request")
+                % CONF.rax_admin_list_max_limit)
+        ids = [str(volume_id) for volume_id in ids]
+        wanted = set(ids)
+        tenant_id = 'admin'
+
+        def not_found_as_none(get, resource_id):
+            try:
+                return get(resource_id)
+            except LunrHttpError as e:
+                if e.code != 404:
+                    raise
+                return None
+
+        def lunr_state(client):
+            if len(wanted) > CONF.rax_admin_get_volumes_list_threshold:
+                found = [volume for volume in client.volumes.list()
+                         if volume['id'] in wanted]
+            else:
+                # a volume lives in one cluster, the others answer 404
+                pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+                found = [volume for volume in pool.imap(
+                    lambda volume_id: not_found_as_none(client.volumes.get, volume_id),
+                    sorted(wanted)) if volume is not None]
+            volumes = dict((volume['id'], volume) for volume in found)
+            nodes = {}
+            for node_id in set(volume['node_id'] for volume in found):
+                node = not_found_as_none(
+                    lambda node_id: memo.cached_node(client, node_id), node_id)
+                if node is not None:
+                    nodes[node_id] = node
+            return volumes, nodes
+
+        results, errors = clusters.fan_out(req, lunr_state, tenant_id)
+        # volume_id -> (cluster, lunr volume, lunr node)
+        located = {}
+        for cluster, (lunr_volumes, lunr_nodes) in results:
+            for volume_id, lunr_volume in lunr_volumes.items():
+                located.setdefault(volume_id, (cluster, lunr_volume,
+                                               lunr_nodes.get(lunr_volume['node_id'])))
+        cinder_volumes = {}
+        if located:
+            cinder_volumes = dict((volume['id'], volume) for volume in
+                                  volume_get_all(cinder.context.get_admin_context(), None, None,
+                                                 sort_keys=['created_at'], sort_dirs=['asc'],
+                                                 filters={'id': sorted(located)}))
+        by_node = {}
+        for volume_id, (cluster, lunr_volume, lunr_node) in located.items():
+            by_node.setdefault((cluster, lunr_volume['node_id']), []).append(volume_id)
+
+        def load_node(key):
+            try:
+                return load_node_volumes(key), {}
+            except LunrError as e:
+                LOG.warning('Unable to load the volumes of node %(node)s: '
+                            '%(error)s', {'node': key[1], 'error': e})
+                error = {'code': getattr(e, 'code', 502), 'message': str(e)}
+                return [], dict((volume_id, error) for volume_id in by_node[key])
+
+        def load_node_volumes(key):
+            cluster, node_id = key
+            lunr_client = clusters.lunr_client(req, cluster, tenant_id)
+            lunr_node = located[by_node[key][0]][2]
+            storage_volumes = {}
+            storage_client = None
+            if lunr_node is not None:
+                lunr_node = records.Record(lunr_node, code=200)
+                url = 'http://%s:%s' % (lunr_node['hostname'], str(lunr_node['port']))
+                storage_client = memo.storage_client(req, url)
+                storage_volumes = dict((volume['id'], volume.with_fields(code=200)) for volume in
+                                       lunr_except_handler(lambda: storage_client.volumes.list())
+                                       if 'id' in volume)
+            loaded = []
+            for volume_id in by_node[key]:
+                volume = {'cluster': cluster,
+                          'lunr_volumes': records.Record(located[volume_id][1], code=200),
+                          'lunr_nodes': lunr_node or {'code': 404}}
+                lunr_exports = lunr_except_handler(lambda: lunr_client.exports.get(volume_id))
+                if lunr_exports['code'] == 200:
+                    volume.update(dict(lunr_exports=[lunr_exports]))
+                if storage_client is not None:
+                    volume.update(dict(storage_volumes=storage_volumes.get(volume_id, {'code': 404})))
+                    storage_exports = lunr_except_handler(lambda: storage_client.exports.get(volume_id))
+                    if storage_exports['code'] == 200:
+                        volume.update(dict(storage_exports=[storage_exports]))
+                    storage_backups = lunr_except_handler(lambda: storage_client.backups.list(volume_id))
+                    volume.update(dict(storage_backups=[storage_backups]))
+                volume.update(dict(lunr_backups=list_lunr_backups(lunr_client, {'volume_id': volume_id})))
+                volume.update({"cinder_volumes": cinder_volumes.get(volume_id)})
+                loaded.append(volume)
+            return loaded
+
+        volumes = {}
+        pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+        for loaded, node_errors in pool.imap(load_node, sorted(by_node)):
+            for volume in loaded:
+                volumes[volume['lunr_volumes']['id']] = volume
+            errors.update(node_errors)
+        # keep the order the ids were asked in
+        ordered = [volumes.pop(volume_id) for volume_id in ids if volume_id in volumes]
+        not_found = sorted(wanted - set(located))
+        for volume_id in not_found:
+            errors[volume_id] = {'code': 404,
+                                 'message': 'Volume not found in any Lunr cluster'}
+        return {"count": len(ordered), "volumes": ordered, "not_found": not_found,
+                "errors": errors}
+
     @wsgi.action('list-nodes')
+    @admission.limited('list-nodes')
+    @profiler.profiled('list-nodes')
     def _list_nodes(self, req, body):
         """
         Returns Lunr Nodes LIST
         :param req: python-cinderclient request
         :param body: python-cinderclient request's body
                     {"list-nodes": null}
+                    {"list-nodes": {"with_health": true}} also queries every
+                    storage node for its live free space, volume and export
+                    counts and response latency
         :return: {"count": <count>, "nodes": [{<Lunr node data 1st node>},
                             {<Lunr node data 2nd node>},
-                            {<Lunr node data 3rd node>}]}
+                            {<Lunr node data 3rd node>}],
+                  "code": <200, 206 if a cluster failed>,
+                  "errors": {"<cluster>": {"code": <code>, "message": <message>}}}
+                 Every node carries the "cluster" it was listed from
         """
         cinder_context = req.environ['cinder.context']
         authorize_list_nodes(cinder_context)
         kwargs = SafeDict(body).get('list-nodes', {})
+        with_health = strutils.bool_from_string(kwargs.pop('with_health', False))
         tenant_id = 'admin'
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
-        lunr_nodes = lunr_except_handler(lambda: lunr_client.nodes.list(**kwargs))
-        nodes = {"count": len(lunr_nodes), "nodes": lunr_nodes}
+        results, errors = clusters.fan_out(req, lambda client: client.nodes.list(**kwargs), tenant_id)
+        lunr_nodes = clusters.merge(results, errors)
+        if with_health:
+            lunr_nodes = records.Envelope(health.probe(req, lunr_nodes), lunr_nodes.code)
+        nodes = {"count": len(lunr_nodes), "nodes": lunr_nodes, "code": lunr_nodes.code,
+                 "errors": errors}
         return nodes
 
     @wsgi.action('list-volumes')
+    @admission.limited('list-volumes')
+    @profiler.profiled('list-volumes')
     def _list_volumes(self, req, body):
         """
         Returns Cinder volume lists for specific query params
@@ -265,7 +664,7 @@ class RaxAdminController(wsgi.Controller):
         admin_context = cinder.context.get_admin_context()
         kwargs = SafeDict(body).get('list-volumes', {})
         tenant_id = 'admin'
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
+        lunr_client = memo.lunr_client(req, tenant_id)
         data_name = "volumes"
         if 'node_id' in kwargs:
             lunr_node = lunr_except_handler(lambda: lunr_client.nodes.get(node_id=kwargs['node_id']))
@@ -303,50 +702,109 @@ class RaxAdminController(wsgi.Controller):
             explanation=_("Must specify node_id, restore_of, id, account_id, or host"))
 
     @wsgi.action('list-out-rotation-nodes')
+    @admission.limited('list-out-rotation-nodes')
+    @profiler.profiled('list-out-rotation-nodes')
     def _list_out_rotation_nodes(self, req, body):
         """
         Returns Lunr nodes list that contains out of rotation
         Nodes.
         :param req: python cinderclient request
         :param body: python cinderclient body
-        :return: {"count": <count>, "nodes": [<node 1>, <node 2]}
+        :return: {"count": <count>, "nodes": [<node 1>, <node 2],
+                  "code": <200, 206 if a cluster failed>,
+                  "errors": {"<cluster>": {"code": <code>, "message": <message>}}}
         """
         cinder_context = req.environ['cinder.context']
         authorize_list_nodes_out_rotation(cinder_context)
         kwargs = SafeDict(body).get('list-out-rotation-nodes', {})
         tenant_id = 'admin'
-        node_list = []
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
-        lunr_nodes_tmp = lunr_except_handler(lambda: lunr_client.nodes.list(**kwargs))
-        if len(lunr_nodes_tmp) > 0:
-            for node in lunr_nodes_tmp:
-                if 'status' in node.keys() and node['status'] != 'ACTIVE':
-                    node_list.append(node)
-        else:
-            nodes = {"count": len(lunr_nodes_tmp), "nodes": lunr_nodes_tmp}
-            return nodes
-        nodes = {"count": len(node_list), "nodes": node_list}
+        results, errors = clusters.fan_out(req, lambda client: client.nodes.list(**kwargs), tenant_id)
+        lunr_nodes = clusters.merge(results, errors)
+        node_list = [node for node in lunr_nodes
+                     if 'status' in node and node['status'] != 'ACTIVE']
+        nodes = {"count": len(node_list), "nodes": node_list, "code": lunr_nodes.code,
+                 "errors": errors}
         return nodes
 
+    @wsgi.action('list-backups')
+    @admission.limited('list-backups')
+    @profiler.profiled('list-backups')
+    def _list_backups(self, req, body):
+        """
+        Returns a page of Lunr backups from one filtered Lunr query, oldest
+        first
+        :param req: python cinderclient request
+        :param body: python cinderclient body
+                    {"list-backups": {"volume_id": "<volume_id>",
+                                      "account_id": "<account_id>",
+                                      "status": "<status>",
+                                      "since": "<iso8601>", "until": "<iso8601>",
+                                      "marker": "<backup_id>", "limit": <limit>}}
+                    All keys are optional
+        :return: {"count": <count>, "backups": [{<backup 1>}, {<backup 2>}, ...],
+                  "next_marker": "<backup_id>" or null}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_list_backups(cinder_context)
+        kwargs = SafeDict(body).get('list-backups', {})
+        filters = dict((key, kwargs[key]) for key in
+                       ('volume_id', 'account_id', 'status') if key in kwargs)
+        try:
+            since, until = [timeutils.normalize_time(timeutils.parse_isotime(kwargs[key]))
+                            if kwargs.get(key) else None for key in ('since', 'until')]
+            limit = int(kwargs.get('limit', CONF.rax_admin_list_max_limit))
+        except (TypeError, ValueError):
+            raise exc.HTTPBadRequest(
+                explanation=_("since and until must be ISO 8601 times, "
+                              "limit an integer"))
+        limit = max(0, min(limit, CONF.rax_admin_list_max_limit))
+        tenant_id = 'admin'
+        lunr_client = memo.lunr_client(req, tenant_id)
+        backups = list_lunr_backups(lunr_client, filters, since, until)
+        if backups and 'id' not in backups[0]:
+            # Lunr error
+            return backups[0]
+        start = 0
+        marker = kwargs.get('marker')
+        if marker:
+            ids = [backup['id'] for backup in backups]
+            if marker not in ids:
+                raise exc.HTTPBadRequest(
+                    explanation=_("marker [%s] not found") % marker)
+            start = ids.index(marker) + 1
+        page = backups[start:start + limit]
+        next_marker = None
+        if page and start + limit < len(backups):
+            next_marker = page[-1]['id']
+        return {"count": len(page), "backups": page, "next_marker": next_marker}
+
     @wsgi.action('list-lunr-volumes')
+    @admission.limited('list-lunr-volumes')
+    @profiler.profiled('list-lunr-volumes')
     def _list_lunr_volumes(self, req, body):
         """
         Returns list of Lunr volumes
         :param req: python cinderclient request
         :param body: python cinderclient body
         :return: Returns List of Lunr volumes
-                {"lunr_volumes": [{<data volume 1>}, {<data volume 2>}, ... ]}
+                {"count": <count>, "volumes": [{<data volume 1>}, {<data volume 2>}, ... ],
+                 "code": <200, 206 if a cluster failed>,
+                 "errors": {"<cluster>": {"code": <code>, "message": <message>}}}
+                Every volume carries the "cluster" it was listed from
         """
         cinder_context = req.environ['cinder.context']
         authorize_list_lunr_volumes(cinder_context)
         kwargs = SafeDict(body).get('list-lunr-volumes', {})
         tenant_id = 'admin'
-        lunr_client = lunrclient.client.LunrClient(tenant_id)
-        lunr_volumes_data = lunr_except_handler(lambda: lunr_client.volumes.list(**kwargs))
-        lunr_volumes = {"count": len(lunr_volumes_data), "volumes": lunr_volumes_data}
+        results, errors = clusters.fan_out(req, lambda client: client.volumes.list(**kwargs), tenant_id)
+        lunr_volumes_data = clusters.merge(results, errors)
+        lunr_volumes = {"count": len(lunr_volumes_data), "volumes": lunr_volumes_data,
+                        "code": lunr_volumes_data.code, "errors": errors}
         return lunr_volumes
 
     @wsgi.action('status-volumes-all')
+    @admission.limited('status-volumes-all')
+    @profiler.profiled('status-volumes-all')
     def _status_volumes_all(self, req, body):
         """
         Not Completed. Currently returns get-volume data for every volume
@@ -359,11 +817,15 @@ class RaxAdminController(wsgi.Controller):
         authorize_status_volumes_all(cinder_context)
         tenant_id = 'admin'
         kwargs = SafeDict(body).get('status-volumes-all', {})
+        if kwargs.get('async'):
+            return self._submit_job(req, 'status-volumes-all',
+                                    self._status_volumes_all, body)
         list_lunr_volumes_body = {"list-volumes": None}
         lunr_volumes = self._list_lunr_volumes(req, body=list_lunr_volumes_body)
         volumes = []
-        for volume in lunr_volumes['lunr_volumes']:
-            get_volume_body = {"get-volume": {"id": volume['id']}}
+        for volume in lunr_volumes['volumes']:
+            get_volume_body = {"get-volume": {"id": volume['id'],
+                                              "cluster": volume['cluster']}}
             volume_data = self._get_volume(req, body=get_volume_body)['volume']
             volumes.append(volume_data)
             del volume_data
@@ -372,7 +834,66 @@ class RaxAdminController(wsgi.Controller):
         return dict(compare_volumes=volumes)
 
 
+    @wsgi.action('export-inventory')
+    @admission.limited('export-inventory')
+    @profiler.profiled('export-inventory')
+    def _export_inventory(self, req, body):
+        """
+        Streams the Cinder volumes and snapshots, with their host and
+        project, as gzip compressed NDJSON. Rows are read with a server side
+        cursor and written as they arrive, one {"resource": "volume", ...}
+        or {"resource": "snapshot", ...} object per line.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"export-inventory": {"resources": ["volumes", "snapshots"],
+                                          "columns": {"volumes": ["id", "host", ...]},
+                                          "updated_since": "<iso8601>"}}
+                    All keys are optional, every resource and column is
+                    exported by default. With updated_since only the rows
+                    updated or deleted since are exported, deleted ones
+                    included; pass back the X-Rax-Inventory-As-Of header
+                    of the previous export.
+        :return: application/gzip stream
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_export_inventory(cinder_context)
+        kwargs = SafeDict(body).get('export-inventory', {})
+        resources = kwargs.get('resources', sorted(inventory.COLUMNS))
+        columns = kwargs.get('columns', {})
+        selection = []
+        for resource in resources:
+            if resource not in inventory.COLUMNS:
+                raise exc.HTTPBadRequest(
+                    explanation=_("Unknown resource %s") % resource)
+            allowed = inventory.COLUMNS[resource]
+            chosen = columns.get(resource, sorted(allowed))
+            unknown = set(chosen) - set(allowed)
+            if unknown:
+                raise exc.HTTPBadRequest(
+                    explanation=_("Unknown %(resource)s columns: %(columns)s")
+                    % {'resource': resource, 'columns': ', '.join(sorted(unknown))})
+            selection.append((resource, list(chosen)))
+        since = None
+        if kwargs.get('updated_since'):
+            try:
+                since = timeutils.normalize_time(
+                    timeutils.parse_isotime(kwargs['updated_since']))
+            except (TypeError, ValueError):
+                raise exc.HTTPBadRequest(
+                    explanation=_("updated_since must be an ISO 8601 time"))
+        as_of = timeutils.utcnow()
+        response = webob.Response(
+            content_type='application/gzip',
+            app_iter=inventory.gzip_ndjson(inventory.records(selection, since)))
+        response.headers['Content-Disposition'] = (
+            'attachment; filename="inventory-%s.ndjson.gz"'
+            % as_of.strftime('%Y%m%dT%H%M%SZ'))
+        response.headers['X-Rax-Inventory-As-Of'] = as_of.isoformat()
+        return response
+
     @wsgi.action('update_node')
+    @admission.limited('update_node')
+    @profiler.profiled('update_node')
     def update_node(self, req, body):
         """updates nodes details like status, weightage, size,
         storage-hostname', hostname, port
@@ -387,7 +908,7 @@ class RaxAdminController(wsgi.Controller):
             e = "Node id is not provided"
             LOG.error(e)
             return {'code': 400, 'msg': e}
-        lunr_client = lunrclient.client.LunrClient('admin', timeout=5)
+        lunr_client = memo.lunr_client(req, 'admin', timeout=5)
         lunr_node = lunr_except_handler(lambda: lunr_client.nodes.get(id))
         if not lunr_node:
             raise exc.HTTPNotFound("Node %s not found." % id)
@@ -396,9 +917,248 @@ class RaxAdminController(wsgi.Controller):
             lunr_client.nodes.update(id, **node_details)
         except lunrclient.client.LunrError as e:
             return {'code': 400, 'msg': str(e)}
+        finally:
+            memo.forget_node(lunr_client, id)
 
         return {'code': 200, 'msg': 'Node updated successfully'}
 
+    @wsgi.action('evacuate-node')
+    @admission.limited('evacuate-node')
+    @profiler.profiled('evacuate-node')
+    def _evacuate_node(self, req, body):
+        """
+        Moves every volume off a Lunr node in the background. Each volume
+        is put in maintenance, has its node id and cinder host updated,
+        is optionally renamed on the target node and is released again.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"evacuate-node": {"source_node_id": "<node_id>",
+                                       "target_node_id": "<node_id>",
+                                       "concurrency": 4,
+                                       "rename": "<new name, %(id)s is
+                                                  the volume id>"}}
+                    or, to resume an interrupted evacuation
+                    {"evacuate-node": {"resume": "<evacuation id>"}}
+        :return: {"evacuation": {<evacuate-node-status data>}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_evacuate_node(cinder_context)
+        kwargs = SafeDict(body).get('evacuate-node', {})
+        concurrency = kwargs.get('concurrency')
+        if concurrency is not None:
+            try:
+                concurrency = int(concurrency)
+            except (TypeError, ValueError):
+                raise exc.HTTPBadRequest(
+                    explanation=_("concurrency must be an integer"))
+        try:
+            if kwargs.get('resume'):
+                job = evacuation.Evacuation.load(kwargs['resume'])
+            else:
+                source_node_id = kwargs.get('source_node_id')
+                target_node_id = kwargs.get('target_node_id')
+                if not source_node_id or not target_node_id:
+                    raise exc.HTTPBadRequest(
+                        explanation=_("Must specify source_node_id and "
+                                      "target_node_id, or resume"))
+                if source_node_id == target_node_id:
+                    raise exc.HTTPBadRequest(
+                        explanation=_("Source and target node must differ"))
+                job = evacuation.Evacuation.create(
+                    source_node_id, target_node_id,
+                    concurrency=concurrency, rename=kwargs.get('rename'))
+        except jobs.JobNotFound:
+            raise exc.HTTPNotFound(
+                explanation=_("Evacuation %s not found") % kwargs['resume'])
+        except lunrclient.client.LunrError as e:
+            raise exc.HTTPBadRequest(explanation=str(e))
+        job.start(concurrency=concurrency)
+        return dict(evacuation=job.progress())
+
+    @wsgi.action('evacuate-node-status')
+    @admission.limited('evacuate-node-status')
+    @profiler.profiled('evacuate-node-status')
+    def _evacuate_node_status(self, req, body):
+        """
+        Returns progress and per-volume failures of an evacuation
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"evacuate-node-status": {"id": "<evacuation id>"}}
+        :return: {"evacuation": {"id": "<id>", "status": "<status>",
+                                 "total": <count>, "pending": <count>,
+                                 "running": <count>, "completed": <count>,
+                                 "failed": <count>,
+                                 "failures": [{"id": "<volume_id>",
+                                               "step": "<step>",
+                                               "msg": "<error>"}, ...]}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_evacuate_node_status(cinder_context)
+        job_id = SafeDict(body).get('evacuate-node-status', {}).get('id')
+        try:
+            job = evacuation.Evacuation.load(job_id)
+        except jobs.JobNotFound:
+            raise exc.HTTPNotFound(
+                explanation=_("Evacuation %s not found") % job_id)
+        return dict(evacuation=job.progress())
+
+    @wsgi.action('job-status')
+    @admission.limited('job-status')
+    @profiler.profiled('job-status')
+    def _job_status(self, req, body):
+        """
+        Returns the status of an asynchronous report
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"job-status": {"id": "<job id>"}}
+        :return: {"job": {"id": "<job id>", "kind": "<action>",
+                          "status": "pending|running|completed|failed",
+                          "error": "<error>", "created_at": "<time>",
+                          "updated_at": "<time>", "expires_at": "<time>"}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_job_status(cinder_context)
+        job_id = SafeDict(body).get('job-status', {}).get('id')
+        try:
+            job = jobs.JobStore().load(job_id)
+        except jobs.JobNotFound:
+            raise exc.HTTPNotFound(explanation=_("Job %s not found") % job_id)
+        return dict(job=job_view(job))
+
+    @wsgi.action('job-result')
+    @admission.limited('job-result')
+    @profiler.profiled('job-result')
+    def _job_result(self, req, body):
+        """
+        Returns one page of the result of a completed asynchronous report.
+        The report's lists (quotas, compare_volumes, ...) are all paged with
+        the same offset and limit, any other keys of the report are returned
+        as they are. "total" and "next_offset" are kept for reports with a
+        single list.
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"job-result": {"id": "<job id>", "offset": 0,
+                                    "limit": 1000}}
+        :return: {"job": {<job-status data>}, "<list name>": [<page>],
+                  "totals": {"<list name>": <count>},
+                  "next_offsets": {"<list name>": <offset or null>},
+                  "total": <count>, "next_offset": <offset or null>}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_job_result(cinder_context)
+        kwargs = SafeDict(body).get('job-result', {})
+        job_id = kwargs.get('id')
+        try:
+            offset = max(0, int(kwargs.get('offset', 0)))
+            limit = max(1, int(kwargs.get('limit', 1000)))
+        except (TypeError, ValueError):
+            raise exc.HTTPBadRequest(
+                explanation=_("offset and limit must be integers"))
+        store = jobs.JobStore()
+        try:
+            job = store.load(job_id)
+            if job['status'] != 'completed':
+                raise exc.HTTPConflict(
+                    explanation=_("Job %(id)s is %(status)s") % job)
+            result, totals = store.load_result(job_id, offset, limit)
+        except jobs.JobNotFound:
+            raise exc.HTTPNotFound(explanation=_("Job %s not found") % job_id)
+        next_offset = offset + limit
+        next_offsets = dict((key, next_offset if next_offset < total else None)
+                            for key, total in totals.items())
+        page = dict(result, job=job_view(job), totals=totals,
+                    next_offsets=next_offsets)
+        if len(totals) == 1:
+            key = list(totals)[0]
+            page.update(total=totals[key], next_offset=next_offsets[key])
+        return page
+
+    @wsgi.action('admission-stats')
+    @profiler.profiled('admission-stats')
+    def _admission_stats(self, req, body):
+        """
+        Returns the concurrency limits of rax-admin actions in this api
+        worker, with the requests in flight, waiting and shed so far
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"admission-stats": null}
+        :return: {"actions": {"<action>": {"limit": <limit>,
+                                           "in_flight": <count>,
+                                           "waiting": <count>,
+                                           "shed": <count>}, ...}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_admission_stats(cinder_context)
+        return dict(actions=admission.stats())
+
+    @wsgi.action('lunr-stats')
+    @profiler.profiled('lunr-stats')
+    def _lunr_stats(self, req, body):
+        """
+        Returns the Lunr read retry and hedging counters of this api worker
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"lunr-stats": null}
+        :return: {"lunr_stats": {"resilient_reads": <bool>,
+                                 "retries": <count>, "hedges": <count>,
+                                 "hedges_won": <count>, "gave_up": <count>,
+                                 "hedge_delay": <seconds>}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_lunr_stats(cinder_context)
+        stats = dict(retry.STATS, resilient_reads=CONF.lunr_resilient_reads,
+                     hedge_delay=retry.hedge_delay())
+        return dict(lunr_stats=stats)
+
+    @wsgi.action('list-sessions')
+    @admission.limited('list-sessions')
+    @profiler.profiled('list-sessions')
+    def _list_sessions(self, req, body):
+        """
+        Returns the export sessions of a storage node, of an initiator or of
+        a volume, from an index of initiator ip <-> volume ids built over
+        all nodes in parallel and cached for rax_session_index_ttl seconds
+        :param req: python-cinderclient request
+        :param body: python-cinderclient request's body
+                    {"list-sessions": {"node_id": "<node_id>"}}
+                    {"list-sessions": {"initiator": "<ip>"}}
+                    {"list-sessions": {"volume_id": "<volume_id>"}}
+                    Without any of them every session is returned, pass
+                    "refresh": true to bypass the cached index
+        :return: {"count": <count>,
+                  "sessions": [{"node_id": "<node_id>", "volume_id": "<volume_id>",
+                                "initiator_ip": "<ip>"}, ...],
+                  "errors": {"<node_id>": "<error>", ...}}
+        """
+        cinder_context = req.environ['cinder.context']
+        authorize_list_sessions(cinder_context)
+        kwargs = SafeDict(body).get('list-sessions', {})
+        refresh = strutils.bool_from_string(kwargs.get('refresh', False))
+        tenant_id = 'admin'
+        lunr_client = memo.lunr_client(req, tenant_id)
+        try:
+            if 'node_id' in kwargs:
+                nodes = [memo.cached_node(lunr_client, kwargs['node_id'])]
+            elif 'volume_id' in kwargs:
+                lunr_volume = lunr_client.volumes.get(kwargs['volume_id'])
+                nodes = [memo.cached_node(lunr_client, lunr_volume['node_id'])]
+            else:
+                nodes = lunr_client.nodes.list()
+        except lunrclient.client.LunrError as e:
+            # only http errors have a code, the others are transport errors
+            return {'code': getattr(e, 'code', 502), 'msg': str(e)}
+        index = topology.build_index(req, nodes, refresh=refresh)
+        if 'node_id' in kwargs:
+            sessions = index.for_node(nodes[0]['id'])
+        elif 'volume_id' in kwargs:
+            sessions = index.for_volume(kwargs['volume_id'])
+        elif 'initiator' in kwargs:
+            sessions = index.for_initiator(kwargs['initiator'])
+        else:
+            sessions = index.sessions(index.node_of)
+        return {"count": len(sessions), "sessions": sessions,
+                "errors": index.errors}
+
 class Rax_admin(extensions.ExtensionDescriptor):
     """Enable Rax Admin Extension"""
 
@@ -423,13 +1183,14 @@ def lunr_except_handler(client_call, **kwargs):
                 call_data.update({'code': call_data_code})
             elif isinstance(call_data_code, dict):
                 call_data.update(call_data_code)
-        elif isinstance(call_data, list) and len(call_data) > 0:
-            for item in call_data:
-                item.update({'code': call_data_code})
-        elif isinstance(call_data, list) and len(call_data) == 0:
-            call_data.append({'code': call_data_code})
+        elif isinstance(call_data, list):
+            # the code is carried once by the envelope, items are left alone
+            return records.Envelope(call_data, call_data_code)
         return call_data
     except lunrclient.client.LunrError as e:
+        if getattr(e, 'code', None) is None:
+            # no http answer, leave transport errors to the caller
+            raise
         if isinstance(e.code, int):
             return {'code': e.code}
         elif isinstance(e.code, dict):
@@ -437,6 +1198,37 @@ def lunr_except_handler(client_call, **kwargs):
         return e.code
 
 
+def list_lunr_backups(lunr_client, filters, since=None, until=None):
+    """
+    Lists Lunr backups with one filtered query, sorted by (created_at, id).
+    Lunr doesn't filter on time, since/until (naive utc datetimes) are
+    applied here. A Lunr error comes back as a single [{'code': ...}] item,
+    backups as Records.
+    """
+    backups = lunr_except_handler(lambda: lunr_client.backups.list(**filters))
+    if isinstance(backups, dict):
+        return [backups]
+    backups = [backup for backup in backups if 'id' in backup]
+    if since or until:
+        def created(backup):
+            return timeutils.normalize_time(
+                timeutils.parse_isotime(backup['created_at']))
+        backups = [backup for backup in backups
+                   if (since is None or created(backup) >= since) and
+                   (until is None or created(backup) < until)]
+    return sorted(backups, key=lambda backup: (backup.get('created_at'),
+                                               backup['id']))
+
+
+def job_view(job):
+    view = dict((key, job.get(key)) for key in
+                ('id', 'kind', 'status', 'error', 'created_at', 'updated_at'))
+    if job.get('expires'):
+        view['expires_at'] = datetime.datetime.utcfromtimestamp(
+            job['expires']).isoformat()
+    return view
+
+
 def cinder_list_handler(client_call, data_name):
     cinder_return_data = client_call
     cinder_return_data_list = []
@@ -17,26 +17,44 @@ from oslo_log import log as logging
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
 
+from rackspace_cinder_extensions.common import pagination
+from rackspace_cinder_extensions.common import policy
+
 
 LOG = logging.getLogger(__name__)
-authorize = extensions.soft_extension_authorizer('snapshot',
-                                                 'snapshot_list_admin_context')
+authorize = policy.soft_extension_authorizer('snapshot',
+                                             'snapshot_list_admin_context')
 
 
 class SnapshotListAdminContextController(wsgi.Controller):
+    def _elevate(self, req):
+        """Elevate the context of an authorized list, returns whether an
+        approximate count of the whole table was asked for.
+        """
+        context = req.environ['cinder.context']
+        if not authorize(context):
+            return False
+        req.environ['cinder.context'] = context.elevated()
+        return pagination.elevated_list_params(req)
+
+    def _add_count(self, resp_obj):
+        key = "%s:%s" % (Snapshot_list_admin_context.alias,
+                         pagination.APPROXIMATE_COUNT)
+        resp_obj.obj[key] = pagination.approximate_count('snapshots')
+
     @wsgi.extends
     def index(self, req):
-        context = req.environ['cinder.context']
-        if authorize(context):
-            req.environ['cinder.context'] = context.elevated()
-        yield
+        want_count = self._elevate(req)
+        resp_obj = yield
+        if want_count:
+            self._add_count(resp_obj)
 
     @wsgi.extends
     def detail(self, req):
-        context = req.environ['cinder.context']
-        if authorize(context):
-            req.environ['cinder.context'] = context.elevated()
-        yield
+        want_count = self._elevate(req)
+        resp_obj = yield
+        if want_count:
+            self._add_count(resp_obj)
 
 
 class Snapshot_list_admin_context(extensions.ExtensionDescriptor):
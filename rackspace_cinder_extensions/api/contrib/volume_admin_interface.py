@@ -12,7 +12,14 @@
 #  License for the specific language governing permissions and limitations
 #  under the License.
 
+import eventlet
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import strutils
+from oslo_utils import timeutils
+from sqlalchemy import literal
+from sqlalchemy import func
+from sqlalchemy import or_
 from webob import exc, Response
 
 from cinder.api import extensions
@@ -20,7 +27,27 @@ from cinder.api.openstack import wsgi
 from cinder import volume
 from cinder import exception
 from cinder import db
+from cinder.db.sqlalchemy.api import get_session
+from cinder.db.sqlalchemy.api import model_query
+from cinder.db.sqlalchemy import models
 import lunrclient
+from lunrclient.base import LunrHttpError
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import memo
+from rackspace_cinder_extensions.common import profiler
+from rackspace_cinder_extensions.common import retry
+
+
+volume_admin_opts = [
+    cfg.IntOpt('rs_vol_admin_bulk_concurrency',
+               default=8,
+               help='Number of volumes updated concurrently by the '
+                    'rs-vol-admin collection actions'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(volume_admin_opts)
 
 LOG = logging.getLogger(__name__)
 
@@ -42,6 +69,7 @@ class VolumeAdminController(wsgi.Controller):
         return self.volume_api.get(*args, **kwargs)
 
     @wsgi.action('update_hostname')
+    @profiler.profiled('update_hostname')
     def _update_hostname(self, req, id, body):
         """Updates hostname in cinderdb"""
         context = req.environ['cinder.context']
@@ -62,6 +90,7 @@ class VolumeAdminController(wsgi.Controller):
         return volume
 
     @wsgi.action('update_node_id')
+    @profiler.profiled('update_node_id')
     def _update_node_id(self, req, id, body):
         """Updates nodeid in lunrdb"""
         context = req.environ['cinder.context']
@@ -74,24 +103,31 @@ class VolumeAdminController(wsgi.Controller):
         if not new_node_id:
             raise exc.HTTPBadRequest("Invalid new hostname")
         try:
-            lunr_client = lunrclient.client.LunrClient('admin', timeout=5)
-            lunr_volume = lunr_client.volumes.get(id)
+            lunr_client = memo.lunr_client(req, 'admin', timeout=5)
+            lunr_volume = retry.call_with_retry(lunr_client.volumes.get, id)
             LOG.debug('Fetched lunr volume %s ' % id)
-            orig_node = lunr_client.nodes.get(lunr_volume['node_id'])
-            if not orig_node:
+            # The original and new node do not depend on each other
+            pool = eventlet.GreenPool(2)
+            orig_node = pool.spawn(_get_node, lunr_client,
+                                   lunr_volume['node_id'])
+            new_node = pool.spawn(_get_node, lunr_client, new_node_id)
+            if not orig_node.wait():
                 raise exc.HTTPNotFound("Node %s not found. " %
                                        lunr_volume['node_id'])
-            new_node = lunr_client.nodes.get(new_node_id)
-            if not new_node:
+            if not new_node.wait():
                 raise exc.HTTPNotFound("New Node %s not found. " %
                                        new_node_id)
             lunr_client.volumes.update_vol_node_id(id, new_node_id)
+            cache.invalidate_volume(id, lunr_volume['node_id'], new_node_id)
+        except exc.HTTPException:
+            raise
         except Exception as e:
             LOG.error("Error while updating node id %s " % str(e))
             raise exc.HTTPBadRequest(e)
         return volume
 
     @wsgi.action('rename_lunr_volume')
+    @profiler.profiled('rename_lunr_volume')
     def _rename_lunr_volume(self, req, id, body):
         """Renames a logical volume at the storage"""
         context = req.environ['cinder.context']
@@ -104,21 +140,25 @@ class VolumeAdminController(wsgi.Controller):
         msg = "Changing Volume id from %s to %s"
         LOG.debug(msg % (id, new_name))
         try:
-            lunr_client = lunrclient.client.LunrClient('admin', timeout=5)
+            lunr_client = memo.lunr_client(req, 'admin', timeout=5)
             lunr_volume = lunr_client.volumes.get(id)
-            storage_node = lunr_client.nodes.get(lunr_volume['node_id'])
+            storage_node = memo.cached_node(lunr_client,
+                                            lunr_volume['node_id'])
             url = 'http://%s:%s' % (storage_node['hostname'], storage_node['port'])
-            storage_client = lunrclient.client.StorageClient(url, timeout=5)
+            storage_client = memo.storage_client(req, url, timeout=5)
             try:
                 storage_client.volumes.rename(id, new_name)
             except lunrclient.base.LunrHttpError as e:
                 if e.code != 404:
                     raise
+            cache.invalidate_volume(id, lunr_volume['node_id'])
+            cache.invalidate_volume(new_name)
         except exception.NotFound as e:
             raise exc.HTTPNotFound(e)
         return Response(status_int=202)
 
     @wsgi.action('apply_maintenance')
+    @profiler.profiled('apply_maintenance')
     def apply_maintenance(self, req, id, body):
         """Puts/Moves volumes out of maintenance status"""
         context = req.environ['cinder.context']
@@ -154,6 +194,157 @@ class VolumeAdminController(wsgi.Controller):
         return Response(status_int=202)
 
 
+class VolumeAdminBulkController(wsgi.Controller):
+    """Collection level volume admin actions, for example
+
+    curl -i http://cinder.rackspace.com/v2/{tenant_id}/rs-vol-admin/action \
+        -X POST -d '{"update_node_id": {"node_id": "<node_id>",
+                                        "volume_ids": ["<volume_id>"]}}'
+
+    curl -i http://cinder.rackspace.com/v2/{tenant_id}/rs-vol-admin/action \
+        -X POST -d '{"update_hostname": {"old_host": "<host>",
+                                         "new_host": "<host>",
+                                         "dry_run": true}}'
+    """
+    def __init__(self, *args, **kwargs):
+        super(VolumeAdminBulkController, self).__init__(*args, **kwargs)
+        self.volume_api = volume.API()
+
+    @wsgi.action('update_node_id')
+    @profiler.profiled('bulk_update_node_id')
+    def _update_node_id(self, req, body):
+        """Updates nodeid in lunrdb for many volumes, validating the new
+        node once. The volumes' original nodes are not looked up, so this
+        also works when moving volumes off a node lunr no longer knows.
+        :return: {"node_id": "<node_id>",
+                  "volumes": [{"id": "<volume_id>", "code": 200,
+                               "msg": "..."}, ...]}
+        """
+        context = req.environ['cinder.context']
+        if not authorize_update_node_id(context):
+            raise exc.HTTPForbidden()
+        context = context.elevated()
+        params = body.get('update_node_id') or {}
+        new_node_id = params.get('node_id')
+        volume_ids = params.get('volume_ids')
+        if not new_node_id:
+            raise exc.HTTPBadRequest("Invalid new node id")
+        if not volume_ids or not isinstance(volume_ids, list):
+            raise exc.HTTPBadRequest("volume_ids must be a non empty list")
+        lunr_client = memo.lunr_client(req, 'admin', timeout=5)
+        try:
+            new_node = _get_node(lunr_client, new_node_id)
+        except Exception as e:
+            LOG.error("Error while fetching node %s %s" % (new_node_id, e))
+            raise exc.HTTPBadRequest(e)
+        if not new_node:
+            raise exc.HTTPNotFound("New Node %s not found. " % new_node_id)
+
+        def update(volume_id):
+            try:
+                self.volume_api.get(context, volume_id)
+                lunr_volume = retry.call_with_retry(lunr_client.volumes.get,
+                                                    volume_id)
+                lunr_client.volumes.update_vol_node_id(volume_id,
+                                                       new_node_id)
+                cache.invalidate_volume(volume_id, lunr_volume['node_id'],
+                                        new_node_id)
+            except exception.NotFound as e:
+                return {'id': volume_id, 'code': 404, 'msg': str(e)}
+            except LunrHttpError as e:
+                return {'id': volume_id, 'code': e.code, 'msg': str(e)}
+            except Exception as e:
+                LOG.error("Error while updating node id %s " % str(e))
+                return {'id': volume_id, 'code': 400, 'msg': str(e)}
+            return {'id': volume_id, 'code': 200,
+                    'msg': 'Node id updated successfully'}
+
+        pool = eventlet.GreenPool(CONF.rs_vol_admin_bulk_concurrency)
+        results = list(pool.imap(update, volume_ids))
+        return {'node_id': new_node_id, 'volumes': results}
+
+    @wsgi.action('update_hostname')
+    @profiler.profiled('bulk_update_hostname')
+    def _update_hostname(self, req, body):
+        """Moves every volume, and with "backups": true every backup, of a
+        host to a new host, with one UPDATE per table in one transaction.
+        Hosts with the old host as their host part are moved too, keeping
+        their @backend#pool suffix. With "dry_run": true nothing is changed
+        and the counts are what would be moved.
+        :return: {"old_host": "<host>", "new_host": "<host>",
+                  "dry_run": <bool>,
+                  "counts": {"volumes": <count>, "backups": <count>}}
+        """
+        context = req.environ['cinder.context']
+        if not authorize_update_hostname(context):
+            raise exc.HTTPForbidden()
+        context = context.elevated()
+        params = body.get('update_hostname') or {}
+        old_host = params.get('old_host')
+        new_host = params.get('new_host')
+        if not old_host or not new_host or old_host == new_host:
+            raise exc.HTTPBadRequest("old_host and new_host must be given "
+                                     "and differ")
+        try:
+            dry_run = strutils.bool_from_string(params.get('dry_run', False),
+                                                strict=True)
+            with_backups = strutils.bool_from_string(
+                params.get('backups', False), strict=True)
+        except ValueError as e:
+            raise exc.HTTPBadRequest(e)
+        if params.get('snapshots'):
+            # snapshots live on their volume's host, they have no host
+            # column of their own
+            raise exc.HTTPBadRequest("Snapshots have no host to update, "
+                                     "they follow their volumes")
+        tables = [models.Volume]
+        if with_backups:
+            tables.append(models.Backup)
+        counts = _rehost(context, tables, old_host, new_host, dry_run)
+        LOG.info("%(verb)s host %(old)s to %(new)s: %(counts)s",
+                 {'verb': 'Dry run of moving' if dry_run else 'Moved',
+                  'old': old_host, 'new': new_host, 'counts': counts})
+        return {'old_host': old_host, 'new_host': new_host,
+                'dry_run': dry_run, 'counts': counts}
+
+
+def _get_node(lunr_client, node_id):
+    """Fetch a lunr node, returning None if lunr does not know about it"""
+    try:
+        return retry.call_with_retry(lunr_client.nodes.get, node_id)
+    except LunrHttpError as e:
+        if e.code != 404:
+            raise
+        return None
+
+
+def _rehost(context, tables, old_host, new_host, dry_run=False):
+    """Set based host rename of the live rows of each table, all in one
+    transaction. Returns {<table name>: <rows matched>}.
+    """
+    pattern = (old_host.replace('\\', '\\\\').replace('%', '\\%')
+               .replace('_', '\\_'))
+    counts = {}
+    session = get_session()
+    with session.begin():
+        for model in tables:
+            host = model.host
+            query = model_query(context, model, session=session,
+                                read_deleted='no').filter(
+                or_(host == old_host,
+                    host.like(pattern + '@%', escape='\\'),
+                    host.like(pattern + '#%', escape='\\')))
+            if dry_run:
+                counts[model.__tablename__] = query.count()
+                continue
+            # keep the @backend#pool suffix of the hosts that have one
+            renamed = literal(new_host) + func.substr(host, len(old_host) + 1)
+            counts[model.__tablename__] = query.update(
+                {host: renamed, model.updated_at: timeutils.utcnow()},
+                synchronize_session=False)
+    return counts
+
+
 class Volume_admin_interface(extensions.ExtensionDescriptor):
     """Elevates to admin context and
     consists of helper method to execute admin operations on a volume"""
@@ -167,3 +358,9 @@ class Volume_admin_interface(extensions.ExtensionDescriptor):
         controller = VolumeAdminController()
         extension = extensions.ControllerExtension(self, 'volumes', controller)
         return [extension, ]
+
+    def get_resources(self):
+        extension = extensions.ResourceExtension(
+            "rs-vol-admin", VolumeAdminBulkController(),
+            collection_actions={'action': 'POST'})
+        return [extension]
@@ -12,7 +12,9 @@
 #  License for the specific language governing permissions and limitations
 #  under the License.
 
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import strutils
 
 from cinder.api import extensions
 from cinder.api.openstack import wsgi
@@ -20,48 +22,98 @@ from cinder.api import xmlutil
 
 from lunrclient import client
 from lunrclient.base import LunrHttpError
-from lunrclient.client import LunrClient, StorageClient
 
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import memo
+from rackspace_cinder_extensions.common import policy
+from rackspace_cinder_extensions.common import profiler
+
+
+lunr_sessions_opts = [
+    cfg.IntOpt('lunr_sessions_cache_ttl',
+               default=30,
+               help='Seconds the export sessions of a volume are cached'),
+    cfg.IntOpt('lunr_sessions_cache_negative_ttl',
+               default=5,
+               help='Seconds a volume without an export is cached'),
+    cfg.BoolOpt('lunr_sessions_by_default',
+                default=False,
+                help='Add Lunr sessions to every authorized volume show, '
+                     'not only those asking for them'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(lunr_sessions_opts)
 
 LOG = logging.getLogger(__name__)
-authorize = extensions.soft_extension_authorizer('volume',
-                                                 'volume_lunr_sessions')
+
+QUERY_PARAM = 'lunr_sessions'
+HEADER = 'X-Rax-Lunr-Sessions'
+
+authorize = policy.soft_extension_authorizer('volume',
+                                             'volume_lunr_sessions')
 
 
 class VolumeLunrSessionsController(wsgi.Controller):
+    def _get_lunr_sessions(self, req, volume_id):
+        """Fetch the export sessions of a volume from its storage node and
+        cache them, a volume without an export is cached for less time.
+        """
+        lunr_sessions = []
+        ttl = CONF.lunr_sessions_cache_ttl
+        lunr_client = memo.lunr_client(req, 'admin', timeout=5)
+        lunr_volume = lunr_client.volumes.get(volume_id)
+        storage_node = memo.cached_node(lunr_client, lunr_volume['node_id'])
+        url = 'http://%s:8081' % storage_node['hostname']
+        storage_client = memo.storage_client(req, url, timeout=5)
+        try:
+            export_info = storage_client.exports.get(volume_id)
+            sessions = export_info.get('sessions', [])
+            for session in sessions:
+                lunr_sessions.append({'initiator_ip': session['ip']})
+        except LunrHttpError as e:
+            if e.code != 404:
+                raise
+            ttl = CONF.lunr_sessions_cache_negative_ttl
+        cache.get_cache(cache.EXPORT_SESSIONS).set(volume_id, lunr_sessions,
+                                                   ttl)
+        return lunr_sessions
+
+    @profiler.profiled('add_lunr_sessions')
     def _add_lunr_sessions(self, req, resp_volume):
         # tenant attribute may not be populated, it's another extension
         db_volume = req.get_db_volume(resp_volume['id'])
         project_id = db_volume['project_id']
-        lunr_sessions = []
+        sessions_cache = cache.get_cache(cache.EXPORT_SESSIONS)
+        lunr_sessions = sessions_cache.get(resp_volume['id'])
         lunr_error = ''
 
-        lunr_client = LunrClient('admin', timeout=5)
-        try:
-            lunr_volume = lunr_client.volumes.get(resp_volume['id'])
-            storage_node = lunr_client.nodes.get(lunr_volume['node_id'])
-            url = 'http://%s:8081' % storage_node['hostname']
-            storage_client = StorageClient(url, timeout=5)
+        if lunr_sessions is None:
             try:
-                export_info = storage_client.exports.get(resp_volume['id'])
-                sessions = export_info.get('sessions', [])
-                for session in sessions:
-                    lunr_sessions.append({'initiator_ip': session['ip']})
-            except LunrHttpError as e:
-                if e.code != 404:
-                    raise
-        except Exception as e:
-            lunr_error = str(e)
+                lunr_sessions = self._get_lunr_sessions(req, resp_volume['id'])
+            except Exception as e:
+                lunr_sessions = []
+                lunr_error = str(e)
 
         key = "%s:sessions" % Volume_lunr_sessions.alias
         resp_volume[key] = lunr_sessions
         key = "%s:error" % Volume_lunr_sessions.alias
         resp_volume[key] = lunr_error
 
+    def _wanted(self, req):
+        """Sessions cost three blocking calls to lunr and a storage node,
+        so they are only added when the request asks for them with
+        ?lunr_sessions=true or an X-Rax-Lunr-Sessions: true header.
+        """
+        wanted = req.GET.get(QUERY_PARAM, req.headers.get(HEADER))
+        if wanted is None:
+            return CONF.lunr_sessions_by_default
+        return strutils.bool_from_string(wanted)
+
     @wsgi.extends
     def show(self, req, id):
         context = req.environ['cinder.context']
-        if authorize(context):
+        if self._wanted(req) and authorize(context):
             req.environ['cinder.context'] = context.elevated()
             resp_obj = yield
             resp_obj.attach(xml=VolumeLunrSessionsTemplate())
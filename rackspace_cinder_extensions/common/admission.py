@@ -0,0 +1,140 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import functools
+
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log as logging
+from webob import exc
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+admission_opts = [
+    cfg.DictOpt('rax_admin_action_limits',
+                default={'status-volumes-all': '1', 'quota-usage': '2',
+                         'top-usage': '2'},
+                help='Maximum number of concurrent requests per api worker '
+                     'for rax-admin actions, as action:limit pairs'),
+    cfg.IntOpt('rax_admin_default_action_limit',
+               default=0,
+               help='Concurrency limit for rax-admin actions not listed in '
+                    'rax_admin_action_limits, 0 means unlimited'),
+    cfg.IntOpt('rax_admin_action_queue_size',
+               default=2,
+               help='Number of requests allowed to wait for a busy '
+                    'rax-admin action before new ones are rejected'),
+    cfg.FloatOpt('rax_admin_action_queue_timeout',
+                 default=5.0,
+                 help='Seconds a request waits for a busy rax-admin action '
+                      'before it is rejected'),
+    cfg.IntOpt('rax_admin_retry_after',
+               default=30,
+               help='Retry-After seconds sent with rejected rax-admin '
+                    'requests'),
+]
+
+CONF.register_opts(admission_opts)
+
+ENVIRON_KEY = 'rackspace_cinder_extensions.admitted'
+
+
+class Gate(object):
+    """Concurrency limit with a small wait queue for one action"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._semaphore = semaphore.Semaphore(limit)
+
+    def enter(self):
+        if self._semaphore.acquire(blocking=False):
+            self.in_flight += 1
+            return True
+        if self.waiting >= CONF.rax_admin_action_queue_size:
+            self.shed += 1
+            return False
+        self.waiting += 1
+        try:
+            admitted = self._semaphore.acquire(
+                timeout=CONF.rax_admin_action_queue_timeout)
+        finally:
+            self.waiting -= 1
+        if not admitted:
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def leave(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'in_flight': self.in_flight,
+                'waiting': self.waiting, 'shed': self.shed}
+
+
+_gates = {}
+
+
+def get_gate(name):
+    limit = int(CONF.rax_admin_action_limits.get(
+        name, CONF.rax_admin_default_action_limit))
+    gate = _gates.get(name)
+    if gate is None or gate.limit != limit:
+        if gate is not None and gate.in_flight:
+            # keep the gate that is in use, the new limit applies once
+            # it drains
+            return gate
+        gate = _gates[name] = Gate(name, limit)
+    return gate
+
+
+def stats():
+    return dict((name, gate.stats()) for name, gate in _gates.items())
+
+
+def limited(name):
+    """Sheds requests for an action with a 429 once its concurrency limit
+    and wait queue are full. Actions called from within an admitted
+    request (status-volumes-all calling get-volume) are not limited again.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, req, *args, **kwargs):
+            gate = get_gate(name)
+            if gate.limit <= 0 or req.environ.get(ENVIRON_KEY):
+                return func(self, req, *args, **kwargs)
+            if not gate.enter():
+                LOG.warning('Shedding rax-admin %(name)s request, '
+                            '%(in_flight)d in flight, %(shed)d shed',
+                            {'name': name, 'in_flight': gate.in_flight,
+                             'shed': gate.shed})
+                raise exc.HTTPTooManyRequests(
+                    explanation='Too many concurrent %s requests' % name,
+                    headers={'Retry-After': str(CONF.rax_admin_retry_after)})
+            req.environ[ENVIRON_KEY] = name
+            try:
+                return func(self, req, *args, **kwargs)
+            finally:
+                del req.environ[ENVIRON_KEY]
+                gate.leave()
+        return wrapper
+    return decorator
@@ -0,0 +1,298 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import collections
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from eventlet import tpool
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+try:
+    import memcache
+except ImportError:
+    memcache = None
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+cache_opts = [
+    cfg.IntOpt('rax_cache_max_entries',
+               default=10000,
+               help='Maximum number of entries kept by each of the caches '
+                    'of the rackspace extensions'),
+    cfg.StrOpt('rax_cache_backend',
+               default='memory',
+               choices=['memory', 'file', 'memcached'],
+               help='Where the caches of the rackspace extensions live. '
+                    'memory is private to each api worker, file is shared '
+                    'by the workers of one host through rax_cache_dir, '
+                    'memcached is shared by every worker using the same '
+                    'rax_cache_memcached_servers'),
+    cfg.ListOpt('rax_cache_process_local',
+                default=['policy-decisions'],
+                help='Caches kept in the memory of each api worker whatever '
+                     'rax_cache_backend is, for entries cheaper to compute '
+                     'than to fetch'),
+    cfg.StrOpt('rax_cache_dir',
+               default='$state_path/rax_cache',
+               help='Directory of the file cache backend, put it on a tmpfs '
+                    'such as /dev/shm to keep it in memory'),
+    cfg.ListOpt('rax_cache_memcached_servers',
+                default=['127.0.0.1:11211'],
+                help='host:port of the memcached servers of the memcached '
+                     'cache backend'),
+]
+
+CONF.register_opts(cache_opts)
+
+# Cache names
+EXPORT_SESSIONS = 'export-sessions'
+LUNR_NODES = 'lunr-nodes'
+POLICY_DECISIONS = 'policy-decisions'
+SESSION_TOPOLOGY = 'session-topology'
+
+
+def make_key(name, key):
+    """The same key for a cache entry in every backend and process"""
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return 'rax:%s:%s' % (name, digest)
+
+
+class TTLCache(object):
+    """Bounded LRU cache where every entry carries its own time to live"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.time():
+            return default
+        # re-insert to mark as most recently used
+        self._entries[key] = entry
+        return value
+
+    def set(self, key, value, ttl):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time() + ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileCache(object):
+    """Cache shared by the api workers of one host, one JSON file per
+    entry under a directory per cache. Values must be JSON serializable.
+
+    The mtime of an entry file is its expiry time, so purging the cache
+    needs no more than a stat of each file. Entries are small and the
+    directory is meant to be on a tmpfs, the occasional purge, which
+    visits every file, runs in a native thread off the eventlet hub.
+    """
+
+    def __init__(self, name, path, max_entries):
+        self.name = name
+        self.path = os.path.join(path, name)
+        self.max_entries = max_entries
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                # another worker got there first
+                if not os.path.isdir(self.path):
+                    raise
+
+    def _file(self, key):
+        return os.path.join(self.path, make_key(self.name, key))
+
+    def get(self, key, default=None):
+        try:
+            with open(self._file(key)) as f:
+                expires, value = jsonutils.load(f)
+        except (IOError, OSError, ValueError):
+            return default
+        if expires < time.time():
+            return default
+        return value
+
+    def set(self, key, value, ttl):
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+        try:
+            expires = time.time() + ttl
+            with os.fdopen(fd, 'w') as f:
+                jsonutils.dump([expires, value], f)
+            os.utime(tmp, (expires, expires))
+            os.rename(tmp, self._file(key))
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        if random.random() < 0.01:
+            tpool.execute(self._purge)
+
+    def _purge(self):
+        """Drop the expired entries, then the closest to expiring over
+        max_entries
+        """
+        now = time.time()
+        files = []
+        for filename in os.listdir(self.path):
+            if filename.startswith('.tmp'):
+                continue
+            path = os.path.join(self.path, filename)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort()
+        excess = len(files) - self.max_entries
+        for index, (expires, path) in enumerate(files):
+            if expires < now or index < excess:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def delete(self, key):
+        try:
+            os.unlink(self._file(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        try:
+            os.makedirs(self.path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len([f for f in os.listdir(self.path)
+                    if not f.startswith('.tmp')])
+
+
+class MemcachedCache(object):
+    """Cache shared through memcached. memcached can't drop a set of keys,
+    so clear() moves the cache to a new generation of keys and lets the old
+    ones expire. Each worker remembers the generation for generation_ttl
+    seconds, the time a clear() in another worker takes to be seen.
+    """
+
+    generation_ttl = 1
+
+    def __init__(self, name, servers):
+        if memcache is None:
+            raise RuntimeError('rax_cache_backend is memcached but the '
+                               'python-memcached module is not installed')
+        self.name = name
+        self._client = memcache.Client(servers)
+        self._generation_key = 'rax:%s:generation' % name
+        self._generation = None
+        self._generation_expires = 0
+
+    def _key(self, key):
+        now = time.time()
+        if self._generation is None or self._generation_expires < now:
+            generation = self._client.get(self._generation_key)
+            if generation is None:
+                self._client.add(self._generation_key, int(now))
+                # another worker may have won the add
+                generation = self._client.get(self._generation_key)
+            if generation is None:
+                # memcached is unreachable, the key won't be found anyway
+                return make_key(self.name, (int(now), key))
+            self._generation = generation
+            self._generation_expires = now + self.generation_ttl
+        return make_key(self.name, (self._generation, key))
+
+    def get(self, key, default=None):
+        value = self._client.get(self._key(key))
+        if value is None:
+            return default
+        return jsonutils.loads(value)
+
+    def set(self, key, value, ttl):
+        self._client.set(self._key(key), jsonutils.dumps(value),
+                         time=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        if self._client.incr(self._generation_key) is None:
+            self._client.set(self._generation_key, int(time.time()))
+        self._generation = None
+
+    def __len__(self):
+        # memcached doesn't count the keys of one cache
+        return 0
+
+
+_caches = {}
+
+
+def invalidate_volume(volume_id, *node_ids):
+    """Drop the cached export sessions of a volume, and the session
+    topology of the nodes it was on or moved to
+    """
+    get_cache(EXPORT_SESSIONS).delete(volume_id)
+    topology = get_cache(SESSION_TOPOLOGY)
+    for node_id in node_ids:
+        if node_id:
+            topology.delete(node_id)
+
+
+def get_cache(name):
+    """The cache called name, on the backend rax_cache_backend configures.
+
+    Every backend has get(key, default), set(key, value, ttl), delete(key)
+    and clear(). Keys may be any value with a stable repr, values shared
+    across workers must be JSON serializable.
+    """
+    backend = CONF.rax_cache_backend
+    if name in CONF.rax_cache_process_local:
+        backend = 'memory'
+    cache = _caches.get((name, backend))
+    if cache is None:
+        if backend == 'file':
+            cache = FileCache(name, CONF.rax_cache_dir,
+                              CONF.rax_cache_max_entries)
+        elif backend == 'memcached':
+            cache = MemcachedCache(name, CONF.rax_cache_memcached_servers)
+        else:
+            cache = TTLCache(CONF.rax_cache_max_entries)
+        _caches[(name, backend)] = cache
+    return cache
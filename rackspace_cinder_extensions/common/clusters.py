@@ -0,0 +1,108 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from lunrclient.base import LunrHttpError
+
+from rackspace_cinder_extensions.common import config  # noqa
+from rackspace_cinder_extensions.common import memo
+from rackspace_cinder_extensions.common import records
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+clusters_opts = [
+    cfg.DictOpt('lunr_clusters',
+                default={},
+                help='Lunr clusters queried by the rax-admin list and '
+                     'get-volume actions, as name:url pairs. When empty the '
+                     'single endpoint the lunr client defaults to is used, '
+                     'under the name "default"'),
+    cfg.FloatOpt('lunr_cluster_timeout',
+                 default=10.0,
+                 help='Seconds a rax-admin action waits on one Lunr cluster '
+                      'before reporting it as an error and answering with '
+                      'the other clusters'),
+]
+
+CONF.register_opts(clusters_opts)
+
+DEFAULT = 'default'
+
+
+def clusters():
+    """[(name, url), ...] sorted by name, url is None for the default"""
+    if not CONF.lunr_clusters:
+        return [(DEFAULT, None)]
+    return sorted(CONF.lunr_clusters.items())
+
+
+def lunr_client(req, cluster, tenant_id='admin', **kwargs):
+    url = dict(clusters()).get(cluster)
+    if url is not None:
+        kwargs['url'] = url
+    elif cluster != DEFAULT:
+        raise KeyError(cluster)
+    return memo.lunr_client(req, tenant_id, **kwargs)
+
+
+def fan_out(req, call, tenant_id='admin'):
+    """Run call(lunr_client) against every cluster concurrently.
+
+    Returns ([(cluster, result), ...], {cluster: error}). Results are in
+    cluster order. A cluster that fails or takes longer than
+    lunr_cluster_timeout is reported in the errors as
+    {"code": <code>, "message": <message>} instead of failing the call.
+    """
+    def run(cluster):
+        name, url = cluster
+        try:
+            with eventlet.Timeout(CONF.lunr_cluster_timeout):
+                return name, call(lunr_client(req, name, tenant_id)), None
+        except eventlet.Timeout:
+            error = {'code': 504, 'message': 'timed out after %ss'
+                     % CONF.lunr_cluster_timeout}
+        except LunrHttpError as e:
+            error = {'code': e.code, 'message': str(e)}
+        except Exception as e:
+            # a bare LunrError is a cluster that can't be reached
+            error = {'code': 502, 'message': str(e)}
+        LOG.warning('Lunr cluster %(cluster)s failed: %(error)s',
+                    {'cluster': name, 'error': error})
+        return name, None, error
+
+    results = []
+    errors = {}
+    pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+    for name, result, error in pool.imap(run, clusters()):
+        if error is None:
+            results.append((name, result))
+        else:
+            errors[name] = error
+    return results, errors
+
+
+def merge(results, errors):
+    """Concatenate the lists returned by fan_out into one Envelope, every
+    item read as a Record tagged with the cluster it came from. Nothing is
+    copied or wrapped until the items are read. The code is 206 when some
+    cluster failed.
+    """
+    parts = [records.Envelope(result, cluster=name)
+             for name, result in results]
+    return records.Envelope(records.Chain(parts), 206 if errors else 200)
@@ -23,6 +23,11 @@ global_opts = [
                help='Specify list of extensions to load when using osapi_'
                     'volume_extension option with rackspace_cinder_extensions.'
                     'select_extensions'),
+    cfg.IntOpt('rax_admin_fanout_concurrency',
+               default=8,
+               help='Number of Lunr or storage node requests a single '
+                    'rax-admin action runs concurrently when it fans out '
+                    'over nodes or volumes'),
 ]
 
 CONF.register_opts(global_opts)
@@ -0,0 +1,252 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+import cinder.context
+from cinder import db
+from lunrclient.base import LunrHttpError
+from lunrclient.client import LunrClient, StorageClient
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import jobs
+from rackspace_cinder_extensions.common import retry
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+evacuation_opts = [
+    cfg.IntOpt('rax_admin_evacuate_concurrency',
+               default=4,
+               help='Default number of volumes moved concurrently by the '
+                    'rax-admin evacuate-node action'),
+    cfg.IntOpt('rax_admin_evacuate_max_concurrency',
+               default=16,
+               help='Upper bound for the concurrency a caller may request '
+                    'from the rax-admin evacuate-node action'),
+]
+
+CONF.register_opts(evacuation_opts)
+
+KIND = 'evacuate-node'
+STEPS = ('apply_maintenance', 'update_node_id', 'update_hostname',
+         'rename_lunr_volume', 'release_maintenance')
+
+
+class Evacuation(object):
+    """Moves every volume off a lunr storage node onto another one.
+
+    Each volume goes through STEPS in order. The state of a volume is
+    checkpointed in the job store after every step, so a resumed job only
+    runs what is left, and only by the api worker holding the job lease.
+    rename_lunr_volume is skipped unless the job was created with a rename
+    format such as "%(id)s".
+    """
+    def __init__(self, job, store=None):
+        self.job = job
+        self.store = store or jobs.JobStore()
+        self.context = cinder.context.get_admin_context()
+        self.lunr_client = LunrClient('admin', timeout=5)
+
+    @classmethod
+    def create(cls, source_node_id, target_node_id, concurrency=None,
+               rename=None, store=None):
+        store = store or jobs.JobStore()
+        lunr_client = LunrClient('admin', timeout=5)
+        target = retry.call_with_retry(lunr_client.nodes.get, target_node_id)
+        lunr_volumes = retry.call_with_retry(lunr_client.volumes.list,
+                                             node_id=source_node_id)
+        volumes = dict((v['id'], {'steps': [], 'status': 'pending'})
+                       for v in lunr_volumes if v.get('status') != 'DELETED')
+        job = store.create(KIND, source_node_id=source_node_id,
+                           target_node_id=target_node_id,
+                           target_cinder_host=target['cinder_host'],
+                           target_hostname=target['hostname'],
+                           target_port=target['port'],
+                           concurrency=_concurrency(concurrency),
+                           rename=rename, volumes=volumes)
+        return cls(job, store)
+
+    @classmethod
+    def load(cls, job_id, store=None):
+        store = store or jobs.JobStore()
+        return cls(_load(store, job_id), store)
+
+    def start(self, concurrency=None):
+        """Run the evacuation in the background, return False if another
+        api worker is running it or it has nothing left to do.
+        """
+        if self.job['status'] == 'completed':
+            return False
+        if not self.store.acquire(self.job['id']):
+            return False
+        try:
+            # a worker may have made progress since the job was loaded
+            self.job = _load(self.store, self.job['id'])
+            if concurrency:
+                self.job['concurrency'] = _concurrency(concurrency)
+            self.job['status'] = 'running'
+            self.job.pop('error', None)
+            self.store.compact(self.job)
+        except Exception:
+            self.store.release(self.job['id'])
+            raise
+        eventlet.spawn_n(self.run)
+        return True
+
+    def run(self):
+        try:
+            pool = eventlet.GreenPool(self.job['concurrency'])
+            pending = [volume_id for volume_id, state
+                       in self.job['volumes'].items()
+                       if state['status'] != 'completed']
+            for _ in pool.imap(self._evacuate_volume, pending):
+                pass
+            failed = [state for state in self.job['volumes'].values()
+                      if state['status'] == 'failed']
+            self.job['status'] = 'failed' if failed else 'completed'
+        except Exception as e:
+            LOG.exception('Evacuation %s stopped' % self.job['id'])
+            self.job['status'] = 'failed'
+            self.job['error'] = str(e)
+        finally:
+            self.store.compact(self.job)
+            self.store.release(self.job['id'])
+
+    def _checkpoint(self, volume_id, state):
+        self.store.checkpoint(self.job['id'], {'id': volume_id,
+                                               'state': state})
+
+    def _evacuate_volume(self, volume_id):
+        state = self.job['volumes'][volume_id]
+        state['status'] = 'running'
+        state.pop('error', None)
+        for step in STEPS:
+            if step in state['steps']:
+                continue
+            try:
+                getattr(self, '_' + step)(volume_id, state)
+            except Exception as e:
+                LOG.error('Evacuation %(job)s failed %(step)s for volume '
+                          '%(volume)s: %(error)s',
+                          {'job': self.job['id'], 'step': step,
+                           'volume': volume_id, 'error': e})
+                state['status'] = 'failed'
+                state['error'] = {'step': step, 'msg': str(e)}
+                self._checkpoint(volume_id, state)
+                return
+            state['steps'].append(step)
+            self._checkpoint(volume_id, state)
+        state['status'] = 'completed'
+        self._checkpoint(volume_id, state)
+
+    def _apply_maintenance(self, volume_id, state):
+        volume = db.volume_get(self.context, volume_id)
+        if volume['status'] == 'maintenance':
+            # an interrupted attempt already got here, keep the status the
+            # volume had before it
+            state.setdefault('previous_status', volume['previous_status'])
+            return
+        state['previous_status'] = volume['status']
+        db.volume_update(self.context, volume_id,
+                         {'migration_status': 'running',
+                          'previous_status': volume['status'],
+                          'status': 'maintenance'})
+
+    def _update_node_id(self, volume_id, state):
+        self.lunr_client.volumes.update_vol_node_id(
+            volume_id, self.job['target_node_id'])
+        cache.invalidate_volume(volume_id, self.job['source_node_id'],
+                                self.job['target_node_id'])
+
+    def _update_hostname(self, volume_id, state):
+        volume = db.volume_get(self.context, volume_id)
+        db.volume_update(self.context, volume_id,
+                         {'host': _rehost(volume['host'],
+                                          self.job['target_cinder_host'])})
+
+    def _rename_lunr_volume(self, volume_id, state):
+        if not self.job.get('rename'):
+            return
+        new_name = self.job['rename'] % {'id': volume_id}
+        url = 'http://%s:%s' % (self.job['target_hostname'],
+                                self.job['target_port'])
+        storage_client = StorageClient(url, timeout=5)
+        try:
+            storage_client.volumes.rename(volume_id, new_name)
+        except LunrHttpError as e:
+            if e.code != 404:
+                raise
+        cache.invalidate_volume(volume_id, self.job['target_node_id'])
+        cache.invalidate_volume(new_name)
+
+    def _release_maintenance(self, volume_id, state):
+        db.volume_update(self.context, volume_id,
+                         {'migration_status': None,
+                          'previous_status': 'maintenance',
+                          'status': state['previous_status']})
+
+    def progress(self):
+        """Summary of the job suitable for returning from the api"""
+        counts = dict((status, 0) for status in
+                      ('pending', 'running', 'completed', 'failed'))
+        failures = []
+        for volume_id, state in self.job['volumes'].items():
+            counts[state['status']] += 1
+            if state['status'] == 'failed':
+                failures.append(dict(state['error'], id=volume_id))
+        progress = dict((key, self.job.get(key)) for key in
+                        ('id', 'status', 'source_node_id', 'target_node_id',
+                         'concurrency', 'created_at', 'updated_at', 'error'))
+        progress.update(counts)
+        progress.update(total=len(self.job['volumes']), failures=failures,
+                        owner=self.store.lease(self.job['id']))
+        return progress
+
+
+def _load(store, job_id):
+    """The last saved evacuation job with its checkpoints applied"""
+    job = store.load(job_id)
+    if job.get('kind') != KIND:
+        raise jobs.JobNotFound(job_id)
+    for entry in store.load_log(job_id):
+        if entry.get('id') in job['volumes']:
+            job['volumes'][entry['id']] = entry['state']
+    return job
+
+
+def _host_part(host):
+    for i, c in enumerate(host):
+        if c in '@#':
+            return host[:i]
+    return host
+
+
+def _rehost(host, new_host):
+    """new_host's host part with the @backend#pool suffix of host, or
+    new_host as it is for a host without a suffix.
+    """
+    suffix = host[len(_host_part(host)):] if host else ''
+    if not suffix:
+        return new_host
+    return _host_part(new_host) + suffix
+
+
+def _concurrency(requested):
+    if not requested:
+        return CONF.rax_admin_evacuate_concurrency
+    return max(1, min(int(requested), CONF.rax_admin_evacuate_max_concurrency))
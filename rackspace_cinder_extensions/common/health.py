@@ -0,0 +1,97 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import time
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from rackspace_cinder_extensions.common import config  # noqa
+from rackspace_cinder_extensions.common import memo
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+health_opts = [
+    cfg.FloatOpt('rax_node_health_timeout',
+                 default=2.0,
+                 help='Seconds list-nodes with_health waits on the status '
+                      'of one storage node'),
+    cfg.FloatOpt('rax_node_health_deadline',
+                 default=10.0,
+                 help='Seconds list-nodes with_health spends probing all '
+                      'the storage nodes, nodes not probed by then are '
+                      'reported as not answering'),
+]
+
+CONF.register_opts(health_opts)
+
+
+def _live_fields(status):
+    """Pick the capacity and load figures out of a storage node's /status"""
+    volumes = status.get('volumes') or {}
+    exports = status.get('exports') or {}
+    return {
+        'free_space': volumes.get('vg_free'),
+        'total_space': volumes.get('vg_size'),
+        'volume_count': volumes.get('volume_count'),
+        'export_count': exports.get('exports', exports.get('export_count')),
+    }
+
+
+def probe(req, nodes):
+    """Query the status of every storage node concurrently.
+
+    Returns each node Record with a "health" field added: the live
+    free space, volume and export counts and the response latency, or
+    "responded": false and the error when the node didn't answer within
+    rax_node_health_timeout. Everything is over by
+    rax_node_health_deadline, nodes still waiting in the pool by then are
+    reported without being queried.
+    """
+    deadline = time.time() + CONF.rax_node_health_deadline
+
+    def check(node):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return node.with_fields(health={'responded': False,
+                                            'error': 'deadline exceeded'})
+        if not node.get('hostname') or not node.get('port'):
+            return node.with_fields(health={
+                'responded': False, 'error': 'no storage node address'})
+        timeout = min(CONF.rax_node_health_timeout, remaining)
+        url = 'http://%s:%s' % (node['hostname'], node['port'])
+        started = time.time()
+        try:
+            with eventlet.Timeout(timeout):
+                status = memo.storage_client(req, url,
+                                             timeout=timeout).status.list()
+        except eventlet.Timeout:
+            return node.with_fields(health={
+                'responded': False,
+                'error': 'timed out after %.1fs' % timeout})
+        except Exception as e:
+            LOG.warning('Unable to query the status of node %(node)s: '
+                        '%(error)s', {'node': node.get('id'), 'error': e})
+            return node.with_fields(health={'responded': False,
+                                            'error': str(e)})
+        health = _live_fields(status)
+        health.update(responded=True,
+                      latency=round(time.time() - started, 3))
+        return node.with_fields(health=health)
+
+    pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+    return list(pool.imap(check, nodes))
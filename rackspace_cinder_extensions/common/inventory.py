@@ -0,0 +1,142 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import datetime
+import zlib
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from sqlalchemy import or_
+
+from cinder.db.sqlalchemy import api as db_api
+from cinder.db.sqlalchemy import models
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+inventory_opts = [
+    cfg.IntOpt('rax_inventory_batch_size',
+               default=1000,
+               help='Rows fetched from the database at a time by the '
+                    'rax-admin export-inventory action'),
+    cfg.IntOpt('rax_inventory_compress_level',
+               default=6,
+               help='gzip compression level of the inventory export, 1-9'),
+]
+
+CONF.register_opts(inventory_opts)
+
+# Exportable columns of each resource. The snapshot host is its volume's.
+COLUMNS = {
+    'volumes': {
+        'id': models.Volume.id,
+        'display_name': models.Volume.display_name,
+        'project_id': models.Volume.project_id,
+        'user_id': models.Volume.user_id,
+        'host': models.Volume.host,
+        'size': models.Volume.size,
+        'status': models.Volume.status,
+        'attach_status': models.Volume.attach_status,
+        'volume_type_id': models.Volume.volume_type_id,
+        'availability_zone': models.Volume.availability_zone,
+        'snapshot_id': models.Volume.snapshot_id,
+        'source_volid': models.Volume.source_volid,
+        'created_at': models.Volume.created_at,
+        'updated_at': models.Volume.updated_at,
+        'deleted_at': models.Volume.deleted_at,
+        'deleted': models.Volume.deleted,
+    },
+    'snapshots': {
+        'id': models.Snapshot.id,
+        'display_name': models.Snapshot.display_name,
+        'project_id': models.Snapshot.project_id,
+        'user_id': models.Snapshot.user_id,
+        'volume_id': models.Snapshot.volume_id,
+        'host': models.Volume.host,
+        'volume_size': models.Snapshot.volume_size,
+        'status': models.Snapshot.status,
+        'progress': models.Snapshot.progress,
+        'created_at': models.Snapshot.created_at,
+        'updated_at': models.Snapshot.updated_at,
+        'deleted_at': models.Snapshot.deleted_at,
+        'deleted': models.Snapshot.deleted,
+    },
+}
+
+_MODELS = {'volumes': models.Volume, 'snapshots': models.Snapshot}
+
+
+def _query(session, resource, columns, since):
+    model = _MODELS[resource]
+    query = session.query(*[COLUMNS[resource][column] for column in columns])
+    if resource == 'snapshots' and 'host' in columns:
+        query = query.outerjoin(models.Volume,
+                                models.Snapshot.volume_id == models.Volume.id)
+    if since is None:
+        query = query.filter(model.deleted == False)  # noqa
+    else:
+        # incremental exports carry the rows deleted since, too. A row
+        # never updated since it was created has no updated_at.
+        query = query.filter(or_(model.created_at >= since,
+                                 model.updated_at >= since,
+                                 model.deleted_at >= since))
+    return (query.order_by(model.id)
+            .execution_options(stream_results=True)
+            .yield_per(CONF.rax_inventory_batch_size))
+
+
+def _primitive(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def records(selection, since=None):
+    """Yield one dict per row of the selected resources.
+
+    :param selection: [(resource, [column, ...]), ...]
+    :param since: only rows created, updated or deleted at or after this
+                  naive utc datetime, deleted rows included
+    """
+    session = db_api.get_session()
+    try:
+        for resource, columns in selection:
+            for row in _query(session, resource, columns, since):
+                record = dict(zip(columns, (_primitive(v) for v in row)))
+                record['resource'] = resource[:-1]
+                yield record
+    finally:
+        session.close()
+
+
+def gzip_ndjson(items):
+    """gzip compressed NDJSON of the items, produced as they arrive"""
+    compressor = zlib.compressobj(CONF.rax_inventory_compress_level,
+                                  zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    count = 0
+    try:
+        for item in items:
+            chunk = compressor.compress(
+                (jsonutils.dumps(item) + '\n').encode('utf-8'))
+            count += 1
+            if chunk:
+                yield chunk
+    except Exception:
+        # the status line is gone already, all we can do is cut the
+        # stream short so the gzip trailer is missing
+        LOG.exception('Inventory export failed after %d rows', count)
+        raise
+    yield compressor.flush()
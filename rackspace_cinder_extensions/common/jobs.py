@@ -0,0 +1,388 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import errno
+import json
+import os
+import re
+import socket
+import struct
+import time
+import uuid
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+job_opts = [
+    cfg.StrOpt('rax_admin_job_dir',
+               default='$state_path/rax_admin_jobs',
+               help='Directory where rax-admin jobs checkpoint their state'),
+    cfg.IntOpt('rax_admin_async_pool_size',
+               default=2,
+               help='Number of asynchronous rax-admin reports run at once '
+                    'by each api worker'),
+    cfg.IntOpt('rax_admin_job_ttl',
+               default=3600,
+               help='Seconds the result of an asynchronous rax-admin report '
+                    'is kept once it has finished'),
+    cfg.IntOpt('rax_admin_job_purge_interval',
+               default=300,
+               help='Seconds between two purges of the expired rax-admin '
+                    'jobs by each api worker'),
+    cfg.IntOpt('rax_admin_job_lease_ttl',
+               default=300,
+               help='Seconds a running rax-admin job may go without a '
+                    'checkpoint before its api worker is considered gone '
+                    'and another one may resume it'),
+]
+
+CONF.register_opts(job_opts)
+
+_JOB_ID = re.compile('^[0-9a-f-]{36}$')
+
+# Byte offset of one item of a result list in the index of a result
+_OFFSET = struct.Struct('>Q')
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class PoolFull(Exception):
+    pass
+
+
+class JobStore(object):
+    """Keeps rax-admin job state as one JSON file per job, and the result
+    of asynchronous reports in files next to it: the lists of the result
+    as NDJSON with an index of the offset of every item, so a page is read
+    without loading the rest, and everything else as JSON.
+
+    Every save replaces the file atomically, so a job interrupted by an
+    api worker restart can be loaded again and resumed from its last
+    checkpoint. Jobs with an 'expires' time are dropped once it passes,
+    they have an empty marker file whose mtime is that time so the purge
+    doesn't need to read any job.
+
+    Checkpoints between saves are appended to a log next to the job, and
+    the api worker running a job holds its lease, a lock file it touches
+    on every checkpoint, so only one worker across the hosts sharing
+    rax_admin_job_dir runs a job at a time.
+    """
+    def __init__(self, path=None):
+        self.path = path or CONF.rax_admin_job_dir
+
+    def _file(self, job_id):
+        if not job_id or not _JOB_ID.match(job_id):
+            raise JobNotFound(job_id)
+        return os.path.join(self.path, '%s.json' % job_id)
+
+    def _result_file(self, job_id, suffix='json'):
+        self._file(job_id)
+        return os.path.join(self.path, '%s.result.%s' % (job_id, suffix))
+
+    def _expires_file(self, job_id):
+        self._file(job_id)
+        return os.path.join(self.path, '%s.expires' % job_id)
+
+    def _lock_file(self, job_id):
+        self._file(job_id)
+        return os.path.join(self.path, '%s.lock' % job_id)
+
+    def _log_file(self, job_id):
+        self._file(job_id)
+        return os.path.join(self.path, '%s.log' % job_id)
+
+    def create(self, kind, **fields):
+        now = timeutils.utcnow().isoformat()
+        job = dict(fields, id=str(uuid.uuid4()), kind=kind,
+                   status='pending', created_at=now, updated_at=now)
+        self.save(job)
+        return job
+
+    def load(self, job_id):
+        try:
+            with open(self._file(job_id)) as f:
+                job = json.load(f)
+        except (IOError, OSError):
+            raise JobNotFound(job_id)
+        if job.get('expires') and job['expires'] < time.time():
+            self.delete(job_id)
+            raise JobNotFound(job_id)
+        if job['status'] in ('pending', 'running') and self._abandoned(job):
+            LOG.warning('rax-admin job %s was abandoned by its api worker',
+                        job_id)
+            job['status'] = 'failed'
+            job['error'] = 'abandoned by its api worker'
+            if job.get('result_ttl'):
+                job['expires'] = time.time() + job['result_ttl']
+            self.save(job)
+        return job
+
+    def _abandoned(self, job):
+        """A job is abandoned once nobody holds its lease and it has not
+        been saved for rax_admin_job_lease_ttl seconds
+        """
+        if self.lease(job['id']):
+            return False
+        try:
+            saved = os.path.getmtime(self._file(job['id']))
+        except OSError:
+            return False
+        return saved + CONF.rax_admin_job_lease_ttl < time.time()
+
+    def load_result(self, job_id, offset=0, limit=None):
+        """The result of a job with its lists cut to [offset:offset+limit],
+        and {list name: full length}
+        """
+        try:
+            with open(self._result_file(job_id)) as f:
+                header = json.load(f)
+            data = open(self._result_file(job_id, 'ndjson'), 'rb')
+            index = open(self._result_file(job_id, 'idx'), 'rb')
+        except (IOError, OSError):
+            raise JobNotFound(job_id)
+        result = header['fields']
+        totals = {}
+        with data, index:
+            for key, (start, count) in header['lists'].items():
+                stop = count if limit is None else min(offset + limit, count)
+                items = []
+                if offset < stop:
+                    index.seek((start + offset) * _OFFSET.size)
+                    data.seek(_OFFSET.unpack(index.read(_OFFSET.size))[0])
+                    for _ in range(stop - offset):
+                        items.append(json.loads(
+                            data.readline().decode('utf-8')))
+                result[key] = items
+                totals[key] = count
+        return result, totals
+
+    def save_result(self, job_id, result):
+        self._makedirs()
+        fields = {}
+        lists = {}
+        data_file = self._result_file(job_id, 'ndjson')
+        index_file = self._result_file(job_id, 'idx')
+        with open(data_file + '.tmp', 'wb') as data, \
+                open(index_file + '.tmp', 'wb') as index:
+            line = 0
+            for key, value in result.items():
+                if not _is_list(value):
+                    fields[key] = value
+                    continue
+                start = line
+                for item in value:
+                    index.write(_OFFSET.pack(data.tell()))
+                    data.write((jsonutils.dumps(item) + '\n')
+                               .encode('utf-8'))
+                    line += 1
+                lists[key] = [start, line - start]
+        os.rename(data_file + '.tmp', data_file)
+        os.rename(index_file + '.tmp', index_file)
+        self._write(self._result_file(job_id),
+                    {'fields': fields, 'lists': lists})
+
+    def acquire(self, job_id):
+        """Take the lease of a job, False if a live worker holds it"""
+        path = self._lock_file(job_id)
+        self._makedirs()
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno != errno.EEXIST or self.lease(job_id):
+                return False
+            # the worker holding it went away, take over its lease
+            LOG.warning('Taking over the lease of rax-admin job %s', job_id)
+            self.release(job_id)
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError:
+                return False
+        with os.fdopen(fd, 'w') as f:
+            f.write('%s:%d' % (socket.gethostname(), os.getpid()))
+        return True
+
+    def lease(self, job_id):
+        """host:pid of the worker holding the lease of a job, None when no
+        worker checkpointed it for rax_admin_job_lease_ttl seconds
+        """
+        path = self._lock_file(job_id)
+        try:
+            if os.path.getmtime(path) + CONF.rax_admin_job_lease_ttl < \
+                    time.time():
+                return None
+            with open(path) as f:
+                return f.read() or None
+        except (IOError, OSError):
+            return None
+
+    def renew(self, job_id):
+        try:
+            os.utime(self._lock_file(job_id), None)
+        except OSError:
+            pass
+
+    def release(self, job_id):
+        try:
+            os.unlink(self._lock_file(job_id))
+        except OSError:
+            pass
+
+    def checkpoint(self, job_id, entry):
+        """Append entry to the log of a job and renew its lease, cheaper
+        than saving the whole job after every change
+        """
+        with open(self._log_file(job_id), 'a') as f:
+            f.write(jsonutils.dumps(entry) + '\n')
+        self.renew(job_id)
+
+    def load_log(self, job_id):
+        """The entries checkpointed since the job was last saved"""
+        try:
+            with open(self._log_file(job_id)) as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # torn write of a worker that died mid checkpoint
+                break
+        return entries
+
+    def compact(self, job):
+        """Save a job that has its log entries applied, and drop the log"""
+        self.save(job)
+        try:
+            os.unlink(self._log_file(job['id']))
+        except OSError:
+            pass
+
+    def delete(self, job_id):
+        for path in (self._file(job_id), self._result_file(job_id),
+                     self._result_file(job_id, 'ndjson'),
+                     self._result_file(job_id, 'idx'),
+                     self._log_file(job_id), self._lock_file(job_id),
+                     self._expires_file(job_id)):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def purge_expired(self):
+        """Drop finished asynchronous jobs whose results have expired"""
+        if not os.path.isdir(self.path):
+            return
+        now = time.time()
+        for name in os.listdir(self.path):
+            job_id = name[:-len('.expires')]
+            if not name.endswith('.expires') or not _JOB_ID.match(job_id):
+                continue
+            try:
+                expired = os.path.getmtime(self._expires_file(job_id)) < now
+            except OSError:
+                continue
+            if expired:
+                self.delete(job_id)
+
+    def save(self, job):
+        job['updated_at'] = timeutils.utcnow().isoformat()
+        self._write(self._file(job['id']), job)
+        if job.get('expires'):
+            path = self._expires_file(job['id'])
+            open(path, 'w').close()
+            os.utime(path, (job['expires'], job['expires']))
+
+    def _makedirs(self):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError:
+                if not os.path.isdir(self.path):
+                    raise
+
+    def _write(self, path, data):
+        self._makedirs()
+        tmp = '%s.tmp' % path
+        with open(tmp, 'w') as f:
+            jsonutils.dump(data, f)
+        os.rename(tmp, path)
+
+
+def _is_list(value):
+    """Lists, and list like values such as a records.Envelope"""
+    return (isinstance(value, (list, tuple)) or
+            (hasattr(value, '__iter__') and hasattr(value, '__len__') and
+             not hasattr(value, 'items') and
+             not isinstance(value, (str, bytes))))
+
+
+_pool = None
+_next_purge = 0
+
+
+def submit(kind, func, store=None):
+    """Run func() in the background report pool and keep what it returns
+    as the job result until rax_admin_job_ttl after it finishes.
+    """
+    global _pool, _next_purge
+    if _pool is None:
+        _pool = eventlet.GreenPool(CONF.rax_admin_async_pool_size)
+    if not _pool.free():
+        raise PoolFull()
+    store = store or JobStore()
+    if _next_purge < time.time():
+        _next_purge = time.time() + CONF.rax_admin_job_purge_interval
+        store.purge_expired()
+    job = store.create(kind, result_ttl=CONF.rax_admin_job_ttl)
+    _pool.spawn_n(_run, store, job, func)
+    return job
+
+
+def _heartbeat(store, job_id):
+    """Keep the lease of a job while its report runs"""
+    while True:
+        eventlet.sleep(CONF.rax_admin_job_lease_ttl / 3.0)
+        store.renew(job_id)
+
+
+def _run(store, job, func):
+    if not store.acquire(job['id']):
+        return
+    heartbeat = eventlet.spawn(_heartbeat, store, job['id'])
+    try:
+        job['status'] = 'running'
+        store.save(job)
+        try:
+            store.save_result(job['id'], func())
+            job['status'] = 'completed'
+        except Exception as e:
+            LOG.exception('rax-admin job %(id)s (%(kind)s) failed' % job)
+            job['status'] = 'failed'
+            job['error'] = getattr(e, 'explanation', None) or str(e)
+        job['expires'] = time.time() + job['result_ttl']
+        store.save(job)
+    finally:
+        heartbeat.kill()
+        store.release(job['id'])
@@ -0,0 +1,192 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import copy
+
+from eventlet import event
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from lunrclient.base import BaseAPI, LunrError, LunrHttpError, ResponseDict
+from lunrclient.client import LunrClient, StorageClient
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import retry
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+memo_opts = [
+    cfg.IntOpt('lunr_nodes_cache_ttl',
+               default=60,
+               help='Seconds a Lunr node looked up by volume show and '
+                    'get-volume stays in the lunr-nodes cache. With the '
+                    'memory cache backend a node updated through one api '
+                    'worker may be seen stale by the others for that long'),
+]
+
+CONF.register_opts(memo_opts)
+
+ENVIRON_KEY = 'rackspace_cinder_extensions.lunr_memo'
+READS = ('get', 'list')
+
+
+class RequestMemo(object):
+    """Remembers Lunr and storage node reads for the life of one request.
+
+    Concurrent callers asking for the same key share a single fetch. Lunr
+    HTTP errors that would fail the same way again (a 404 for instance) are
+    remembered like any other answer. Transient errors (5xx, transport
+    errors) and anything that interrupts the fetch, an eventlet.Timeout
+    included, are not, so a retry really goes back to the server and no
+    later reader waits on a fetch that will never finish.
+    Callers get a shallow copy, so lunr_except_handler adding a 'code' to
+    an answer does not change what the next caller sees.
+    """
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, key, func, *args, **kwargs):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            LOG.debug('Lunr memo hit for %(key)s (hits=%(hits)d, '
+                      'misses=%(misses)d)',
+                      {'key': key, 'hits': self.hits, 'misses': self.misses})
+            return copy.copy(entry.wait())
+        entry = self._entries[key] = event.Event()
+        self.misses += 1
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            if not isinstance(e, LunrHttpError) or retry.is_transient(e):
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            if not isinstance(e, Exception):
+                # don't hand our own Timeout or GreenletExit to the
+                # readers waiting on us, they see a transient error
+                entry.send(exc=LunrError('Lunr read of %s interrupted'
+                                         % (key,)))
+            else:
+                entry.send(exc=e)
+            raise
+        entry.send(result)
+        return copy.copy(result)
+
+    def invalidate(self, scope, resource=None):
+        for key in list(self._entries):
+            if key[0] == scope and resource in (None, key[1]):
+                del self._entries[key]
+
+
+class _MemoResource(object):
+    def __init__(self, memo, scope, name, resource):
+        self._memo = memo
+        self._scope = scope
+        self._name = name
+        self._resource = resource
+
+    def __getattr__(self, method):
+        func = getattr(self._resource, method)
+        if not callable(func):
+            return func
+        if method in READS:
+            resilient = CONF.lunr_resilient_reads
+
+            def read(*args, **kwargs):
+                key = (self._scope, self._name, method, repr(args),
+                       repr(sorted(kwargs.items())))
+                if resilient:
+                    return self._memo.call(key, retry.call_resilient, func,
+                                           *args, **kwargs)
+                return self._memo.call(key, func, *args, **kwargs)
+            read.__name__ = '%s.%s' % (self._name, method)
+            read.resilient = resilient
+            return read
+
+        def write(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._memo.invalidate(self._scope, self._name)
+        write.__name__ = '%s.%s' % (self._name, method)
+        return write
+
+
+class MemoClient(object):
+    """Wraps a LunrClient or StorageClient so reads go through a memo and
+    writes drop what was remembered about the resource they touch.
+
+    With lunr_resilient_reads the retries and hedges happen under the
+    memo, so a hedged request really goes to the server instead of
+    waiting on the fetch it is meant to race.
+    """
+    def __init__(self, memo, scope, client):
+        self._memo = memo
+        self._scope = scope
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if isinstance(attr, BaseAPI):
+            return _MemoResource(self._memo, self._scope, name, attr)
+        return attr
+
+
+def get_memo(req):
+    memo = req.environ.get(ENVIRON_KEY)
+    if memo is None:
+        memo = req.environ[ENVIRON_KEY] = RequestMemo()
+    return memo
+
+
+def lunr_client(req, tenant_id='admin', **kwargs):
+    client = LunrClient(tenant_id, **kwargs)
+    scope = ('lunr', client.url, tenant_id)
+    return MemoClient(get_memo(req), scope, client)
+
+
+def storage_client(req, url, **kwargs):
+    client = StorageClient(url, **kwargs)
+    return MemoClient(get_memo(req), ('storage', url), client)
+
+
+def _node_key(lunr_client, node_id):
+    return (lunr_client.url, node_id)
+
+
+def cached_node(lunr_client, node_id):
+    """nodes.get through the lunr-nodes cache, shared by the api workers
+    when rax_cache_backend is. Errors are not cached.
+    """
+    nodes = cache.get_cache(cache.LUNR_NODES)
+    key = _node_key(lunr_client, node_id)
+    node = nodes.get(key)
+    if node is None:
+        node = lunr_client.nodes.get(node_id)
+        nodes.set(key, dict(node), CONF.lunr_nodes_cache_ttl)
+        return node
+    return ResponseDict(node, 200)
+
+
+def forget_node(lunr_client, node_id):
+    """Drop a node updated through this worker from the caches. On the
+    memory cache backend the other workers keep their copy until
+    lunr_nodes_cache_ttl passes.
+    """
+    cache.get_cache(cache.LUNR_NODES).delete(_node_key(lunr_client, node_id))
+    cache.get_cache(cache.SESSION_TOPOLOGY).delete(node_id)
@@ -0,0 +1,103 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import strutils
+import sqlalchemy
+from webob import exc
+
+from cinder.db.sqlalchemy import api as db_api
+from cinder.i18n import _
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+pagination_opts = [
+    cfg.IntOpt('rax_all_tenants_max_limit',
+               default=500,
+               help='Largest page returned by volume and snapshot lists '
+                    'elevated to all tenants by the list admin context '
+                    'extensions'),
+]
+
+CONF.register_opts(pagination_opts)
+
+APPROXIMATE_COUNT = 'approximate_count'
+_SORT_PARAMS = ('sort', 'sort_key', 'sort_dir')
+
+
+def elevated_list_params(req):
+    """Rewrite an all-tenant list request to page by keyset.
+
+    The page size is capped at rax_all_tenants_max_limit, offset paging is
+    refused and the sort order is forced to (created_at, id) so the marker
+    turns into a range scan instead of a walk over every earlier row.
+    Only the direction of the caller's sort_dir is kept.
+
+    Returns True if the caller asked for an approximate total count. The
+    approximate_count parameter is always removed, the core api would
+    otherwise take it as a filter.
+    """
+    params = req.GET
+    want_count = strutils.bool_from_string(params.pop(APPROXIMATE_COUNT,
+                                                      False))
+    if 'all_tenants' not in params:
+        return False
+    if 'offset' in params:
+        raise exc.HTTPBadRequest(
+            explanation=_("offset is not supported when listing all "
+                          "tenants, page with marker instead"))
+    max_limit = CONF.rax_all_tenants_max_limit
+    try:
+        limit = int(params.get('limit', max_limit))
+    except ValueError:
+        raise exc.HTTPBadRequest(
+            explanation=_("limit param must be an integer"))
+    params['limit'] = str(max(0, min(limit, max_limit)))
+    direction = params.get('sort_dir', 'desc')
+    if direction not in ('asc', 'desc'):
+        direction = 'desc'
+    for key in _SORT_PARAMS:
+        params.pop(key, None)
+    params['sort'] = 'created_at:%(dir)s,id:%(dir)s' % {'dir': direction}
+    return want_count
+
+
+def approximate_count(table_name):
+    """Row count of a table from the database statistics.
+
+    This counts soft deleted rows too and can be off by a few percent, but
+    costs a catalog lookup instead of a scan. Databases without usable
+    statistics (sqlite in tests) fall back to COUNT(*).
+    """
+    engine = db_api.get_engine()
+    dialect = engine.dialect.name
+    if dialect == 'mysql':
+        query = sqlalchemy.text(
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = :table")
+    elif dialect == 'postgresql':
+        query = sqlalchemy.text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = :table")
+    else:
+        query = sqlalchemy.text("SELECT COUNT(*) FROM %s" % table_name)
+    try:
+        count = engine.execute(query, table=table_name).scalar()
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        LOG.warning('Unable to count %(table)s rows: %(error)s',
+                    {'table': table_name, 'error': e})
+        return None
+    return int(count) if count is not None else None
@@ -0,0 +1,88 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import os
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from cinder.api import extensions
+from cinder import exception
+
+from rackspace_cinder_extensions.common import cache
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+policy_opts = [
+    cfg.IntOpt('rax_policy_cache_ttl',
+               default=300,
+               help='Seconds a soft authorizer decision is cached, 0 '
+                    'disables the cache. Decisions are also dropped as soon '
+                    'as the policy file changes.'),
+]
+
+CONF.register_opts(policy_opts)
+
+_state = {'path': None, 'mtime': None}
+
+
+def _policy_mtime():
+    """Modification time of the policy file, None if it can't be found"""
+    try:
+        if _state['path'] is None:
+            _state['path'] = CONF.find_file(CONF.oslo_policy.policy_file)
+        return os.path.getmtime(_state['path'])
+    except (OSError, TypeError):
+        _state['path'] = None
+        return None
+
+
+def soft_extension_authorizer(api_name, extension_name):
+    """Same as cinder's soft_extension_authorizer, but remembers decisions.
+
+    The answer of a rule only depends on the caller's roles, project and
+    admin flag, and on the policy file, so those make up the key. The
+    whole cache is flushed when the policy file's mtime changes.
+    """
+    hard_authorize = extensions.extension_authorizer(api_name, extension_name)
+    rule = '%s_extension:%s' % (api_name, extension_name)
+
+    def authorize(context):
+        if CONF.rax_policy_cache_ttl <= 0:
+            return _soft(hard_authorize, context)
+        decisions = cache.get_cache(cache.POLICY_DECISIONS)
+        mtime = _policy_mtime()
+        if mtime != _state['mtime']:
+            if _state['mtime'] is not None:
+                LOG.debug('Policy file changed, flushing cached decisions')
+            decisions.clear()
+            _state['mtime'] = mtime
+        key = (rule, tuple(sorted(context.roles or [])), context.project_id,
+               context.is_admin, mtime)
+        allowed = decisions.get(key)
+        if allowed is None:
+            allowed = _soft(hard_authorize, context)
+            decisions.set(key, allowed, CONF.rax_policy_cache_ttl)
+        return allowed
+    return authorize
+
+
+def _soft(hard_authorize, context):
+    try:
+        hard_authorize(context)
+        return True
+    except exception.NotAuthorized:
+        return False
@@ -0,0 +1,118 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import cProfile
+import functools
+import os
+import random
+import time
+
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import strutils
+
+from rackspace_cinder_extensions.common import policy
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+profiler_opts = [
+    cfg.FloatOpt('rax_profile_sample_rate',
+                 default=0.0,
+                 help='Fraction of requests to the rackspace extension '
+                      'actions that are profiled, between 0 and 1'),
+    cfg.StrOpt('rax_profile_dir',
+               default='$state_path/rax_profiles',
+               help='Directory where request profiles are written'),
+    cfg.IntOpt('rax_profile_retention',
+               default=200,
+               help='Number of profile files kept, the oldest are removed'),
+]
+
+CONF.register_opts(profiler_opts)
+
+HEADER = 'X-Rax-Profile'
+ENVIRON_KEY = 'rackspace_cinder_extensions.profiling'
+
+authorize_profile = policy.soft_extension_authorizer('rax-admin', 'profile')
+
+# cProfile hooks the whole OS thread, which every green thread of the api
+# worker shares, so only one request of the process is profiled at a time
+_profiling = semaphore.Semaphore(1)
+
+
+def _wanted(req):
+    if strutils.bool_from_string(req.headers.get(HEADER)):
+        context = req.environ.get('cinder.context')
+        if context is not None and authorize_profile(context):
+            return True
+    rate = CONF.rax_profile_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def _dump(profile, name, req):
+    path = CONF.rax_profile_dir
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    context = req.environ.get('cinder.context')
+    request_id = getattr(context, 'request_id', None) or 'unknown'
+    filename = os.path.join(path, '%d-%s-%s.prof' % (
+        int(time.time() * 1000), name, request_id))
+    profile.dump_stats(filename)
+    LOG.info('Wrote profile of %(name)s to %(file)s',
+             {'name': name, 'file': filename})
+    profiles = sorted(os.path.join(path, f) for f in os.listdir(path)
+                      if f.endswith('.prof'))
+    for old in profiles[:-CONF.rax_profile_retention or None]:
+        try:
+            os.unlink(old)
+        except OSError:
+            pass
+
+
+def profiled(name):
+    """Profile a controller method for sampled requests, or requests that
+    send X-Rax-Profile: true and pass the rax-admin:profile policy.
+
+    Only the outermost profiled call of a request is profiled, and only
+    one request per api worker at a time, the others run unprofiled. The
+    profile covers everything that runs on the api worker's thread while
+    the call is in progress, green threads serving other requests
+    included, so read it for hot paths rather than exact totals.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, req, *args, **kwargs):
+            if req.environ.get(ENVIRON_KEY) or not _wanted(req):
+                return func(self, req, *args, **kwargs)
+            if not _profiling.acquire(blocking=False):
+                LOG.debug('Another request is being profiled, not '
+                          'profiling %s', name)
+                return func(self, req, *args, **kwargs)
+            req.environ[ENVIRON_KEY] = name
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, self, req, *args, **kwargs)
+            finally:
+                del req.environ[ENVIRON_KEY]
+                _profiling.release()
+                try:
+                    _dump(profile, name, req)
+                except Exception as e:
+                    LOG.warning('Unable to write profile of %(name)s: '
+                                '%(error)s', {'name': name, 'error': e})
+        return wrapper
+    return decorator
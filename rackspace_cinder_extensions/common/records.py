@@ -0,0 +1,132 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import itertools
+
+
+class Record(object):
+    """Read only view of one item of a Lunr list response.
+
+    The decoded JSON is shared, never copied or changed, fields added by
+    the extensions (the cluster, live health) are kept beside it. The
+    plain dict is only built when the response is serialized, jsonutils
+    turns anything with items() into one.
+    """
+    __slots__ = ('_data', '_extra')
+
+    def __init__(self, data, **extra):
+        self._data = data
+        self._extra = extra or None
+
+    def __getitem__(self, key):
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        return self._data[key]
+
+    def __contains__(self, key):
+        return bool(self._extra and key in self._extra) or key in self._data
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key, value in self.iteritems()]
+
+    def iteritems(self):
+        extra = self._extra or {}
+        for key, value in self._data.items():
+            if key not in extra:
+                yield key, value
+        for item in extra.items():
+            yield item
+
+    items = iteritems
+
+    def to_dict(self):
+        return dict(self.iteritems())
+
+    def with_fields(self, **fields):
+        """A record over the same data with more fields added"""
+        extra = dict(self._extra or {})
+        extra.update(fields)
+        return Record(self._data, **extra)
+
+    def __repr__(self):
+        return 'Record(%r)' % self.to_dict()
+
+
+class Envelope(object):
+    """A Lunr list response: the status code once, and the items, wrapped
+    in a Record as they are read. Serializes as the list of items.
+    """
+    __slots__ = ('code', '_items', '_extra')
+
+    def __init__(self, items, code=200, **extra):
+        self.code = code
+        self._items = items
+        self._extra = extra
+
+    def _wrap(self, item):
+        if isinstance(item, Record):
+            return item.with_fields(**self._extra) if self._extra else item
+        return Record(item, **self._extra)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        for item in self._items:
+            yield self._wrap(item)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Envelope(self._items[index], self.code, **self._extra)
+        return self._wrap(self._items[index])
+
+    def to_list(self):
+        return [record.to_dict() for record in self]
+
+
+class Chain(object):
+    """Several sequences read as one, such as the Envelopes of the
+    clusters a list was fanned out to, without copying their items into
+    a new list.
+    """
+    __slots__ = ('_parts',)
+
+    def __init__(self, parts):
+        self._parts = list(parts)
+
+    def __len__(self):
+        return sum(len(part) for part in self._parts)
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._parts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step < 0:
+                return list(self)[index]
+            return list(itertools.islice(self, start, stop, step))
+        if index < 0:
+            index += len(self)
+        for part in self._parts:
+            if 0 <= index < len(part):
+                return part[index]
+            index -= len(part)
+        raise IndexError(index)
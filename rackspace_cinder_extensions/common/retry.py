@@ -0,0 +1,192 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import collections
+import random
+import re
+import time
+
+import eventlet
+from eventlet import queue
+from oslo_config import cfg
+from oslo_log import log as logging
+import requests
+
+from lunrclient.base import LunrError, LunrHttpError
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+retry_opts = [
+    cfg.IntOpt('lunr_read_retries',
+               default=2,
+               help='Number of times an idempotent Lunr read is retried '
+                    'after a transient error'),
+    cfg.FloatOpt('lunr_retry_backoff',
+                 default=0.2,
+                 help='Base delay in seconds between Lunr read retries, '
+                      'doubled on every attempt'),
+    cfg.FloatOpt('lunr_retry_max_backoff',
+                 default=2.0,
+                 help='Upper bound in seconds for a single Lunr read retry '
+                      'delay'),
+    cfg.BoolOpt('lunr_resilient_reads',
+                default=False,
+                help='Retry and hedge every Lunr and storage node get/list '
+                     'made by the rackspace extensions'),
+    cfg.IntOpt('lunr_max_attempts',
+               default=4,
+               help='Maximum number of requests, retries and hedges '
+                    'included, sent for one resilient Lunr read'),
+    cfg.IntOpt('lunr_hedge_percentile',
+               default=95,
+               help='Latency percentile of recent Lunr reads after which a '
+                    'second, hedged request is sent'),
+    cfg.FloatOpt('lunr_hedge_min_delay',
+                 default=0.1,
+                 help='Minimum seconds to wait before hedging a Lunr read, '
+                      'also used until enough latencies are recorded'),
+]
+
+CONF.register_opts(retry_opts)
+
+STATS = {'retries': 0, 'hedges': 0, 'hedges_won': 0, 'gave_up': 0}
+
+# Latencies of recent successful reads, to pick the hedge delay from
+_latencies = collections.deque(maxlen=500)
+_MIN_SAMPLES = 20
+
+# lunrclient's own checks of the arguments of a call, raised before any
+# request is sent
+_ARGUMENT_ERROR = re.compile(r"is (required|not an) argument for method")
+
+
+def is_transient(error):
+    """Return True if a Lunr error is worth retrying.
+
+    Connection resets and timeouts surface as a bare LunrError, server side
+    failures as a LunrHttpError with a 5xx code. Anything else (404, 409, bad
+    arguments, a malformed url) will fail the same way again.
+    """
+    if isinstance(error, LunrHttpError):
+        return isinstance(error.code, int) and error.code >= 500
+    if not isinstance(error, LunrError):
+        return False
+    cause = getattr(error, '__context__', None)
+    if isinstance(cause, requests.RequestException):
+        return isinstance(cause, (requests.ConnectionError, requests.Timeout))
+    # without the requests exception only the message tells a failed
+    # request from a bad argument
+    return not _ARGUMENT_ERROR.search(str(error))
+
+
+def backoff_delay(attempt):
+    """Full jitter delay for the given (zero based) retry attempt."""
+    ceiling = min(CONF.lunr_retry_max_backoff,
+                  CONF.lunr_retry_backoff * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def call_with_retry(func, *args, **kwargs):
+    """Call an idempotent Lunr read, retrying transient errors.
+
+    Only use this for GETs; writes must not be replayed blindly.
+    """
+    if getattr(func, 'resilient', False):
+        # already retried (and hedged) by call_resilient
+        return func(*args, **kwargs)
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except LunrError as e:
+            if not is_transient(e):
+                raise
+            if attempt >= CONF.lunr_read_retries:
+                STATS['gave_up'] += 1
+                raise
+            STATS['retries'] += 1
+            delay = backoff_delay(attempt)
+            LOG.debug('Retrying %(func)s in %(delay).2fs after: %(error)s',
+                      {'func': getattr(func, '__name__', func),
+                       'delay': delay, 'error': e})
+            time.sleep(delay)
+            attempt += 1
+
+
+def hedge_delay():
+    """Seconds to wait on a read before sending a hedged second request"""
+    if len(_latencies) < _MIN_SAMPLES:
+        return CONF.lunr_hedge_min_delay
+    ordered = sorted(_latencies)
+    index = len(ordered) * CONF.lunr_hedge_percentile // 100
+    return max(CONF.lunr_hedge_min_delay,
+               ordered[min(index, len(ordered) - 1)])
+
+
+def _attempt(results, tag, func, args, kwargs):
+    start = time.time()
+    try:
+        results.put((tag, True, func(*args, **kwargs), time.time() - start))
+    except Exception as e:
+        results.put((tag, False, e, time.time() - start))
+
+
+def call_resilient(func, *args, **kwargs):
+    """Call an idempotent Lunr read with retries and hedging.
+
+    If the first request is slower than the recent latency percentile a
+    second one is sent and whichever answers first wins. Transient errors
+    are retried with jittered backoff. Requests, retries and hedges all
+    count against lunr_max_attempts.
+    """
+    attempts = 0
+    retries = 0
+    while True:
+        results = queue.LightQueue()
+        threads = [eventlet.spawn(_attempt, results, 'first', func, args,
+                                  kwargs)]
+        attempts += 1
+        try:
+            try:
+                answer = results.get(timeout=hedge_delay())
+            except queue.Empty:
+                if attempts < CONF.lunr_max_attempts:
+                    STATS['hedges'] += 1
+                    threads.append(eventlet.spawn(_attempt, results, 'hedge',
+                                                  func, args, kwargs))
+                    attempts += 1
+                answer = results.get()
+            tag, ok, value, elapsed = answer
+            if not ok and len(threads) > 1:
+                # the other request may still succeed
+                tag, ok, value, elapsed = results.get()
+        finally:
+            for thread in threads:
+                thread.kill()
+        if ok:
+            _latencies.append(elapsed)
+            if tag == 'hedge':
+                STATS['hedges_won'] += 1
+            return value
+        if not is_transient(value):
+            raise value
+        if (attempts >= CONF.lunr_max_attempts or
+                retries >= CONF.lunr_read_retries):
+            STATS['gave_up'] += 1
+            raise value
+        STATS['retries'] += 1
+        time.sleep(backoff_delay(retries))
+        retries += 1
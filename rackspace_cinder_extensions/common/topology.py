@@ -0,0 +1,131 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+from eventlet import semaphore
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from lunrclient.base import LunrHttpError
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import config  # noqa
+from rackspace_cinder_extensions.common import memo
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+topology_opts = [
+    cfg.IntOpt('rax_session_index_ttl',
+               default=30,
+               help='Seconds the export sessions collected from a storage '
+                    'node are cached by the rax-admin list-sessions action'),
+]
+
+CONF.register_opts(topology_opts)
+
+
+class SessionIndex(object):
+    """Two way index of initiator ip <-> volume ids over storage nodes"""
+
+    def __init__(self):
+        self.by_volume = {}
+        self.by_initiator = {}
+        self.node_of = {}
+        self.errors = {}
+
+    def add_node(self, node_id, volumes):
+        for volume_id, initiators in volumes.items():
+            self.node_of[volume_id] = node_id
+            self.by_volume[volume_id] = initiators
+            for ip in initiators:
+                self.by_initiator.setdefault(ip, set()).add(volume_id)
+
+    def sessions(self, volume_ids):
+        return [{'node_id': self.node_of[volume_id], 'volume_id': volume_id,
+                 'initiator_ip': ip}
+                for volume_id in sorted(volume_ids)
+                for ip in self.by_volume.get(volume_id, [])]
+
+    def for_node(self, node_id):
+        return self.sessions(volume_id for volume_id, node
+                             in self.node_of.items() if node == node_id)
+
+    def for_initiator(self, ip):
+        return self.sessions(self.by_initiator.get(ip, ()))
+
+    def for_volume(self, volume_id):
+        return self.sessions([volume_id] if volume_id in self.node_of
+                             else [])
+
+
+def _node_sessions(req, node, slots, refresh=False):
+    """{volume_id: [initiator ip, ...]} for every volume on a node,
+    cached for rax_session_index_ttl seconds. Every Lunr and storage node
+    request holds one of the slots.
+    """
+    topology = cache.get_cache(cache.SESSION_TOPOLOGY)
+    volumes = None if refresh else topology.get(node['id'])
+    if volumes is not None:
+        return volumes
+    lunr_client = memo.lunr_client(req, 'admin', timeout=5)
+    url = 'http://%s:%s' % (node['hostname'], node['port'])
+    storage_client = memo.storage_client(req, url, timeout=5)
+    with slots:
+        lunr_volumes = lunr_client.volumes.list(node_id=node['id'])
+    volume_ids = [volume['id'] for volume in lunr_volumes
+                  if volume.get('status') != 'DELETED']
+
+    def export_sessions(volume_id):
+        try:
+            with slots:
+                export = storage_client.exports.get(volume_id)
+        except LunrHttpError as e:
+            if e.code != 404:
+                raise
+            return volume_id, []
+        return volume_id, sorted(set(session['ip'] for session
+                                     in export.get('sessions', [])))
+
+    pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+    volumes = dict(pool.imap(export_sessions, volume_ids))
+    topology.set(node['id'], volumes, CONF.rax_session_index_ttl)
+    return volumes
+
+
+def build_index(req, nodes, refresh=False):
+    """Collect the export sessions of every volume on the given lunr nodes,
+    querying the nodes concurrently. At most rax_admin_fanout_concurrency
+    requests are in flight, across all the nodes. A node that fails is
+    reported in the index errors instead of failing the whole index.
+    """
+    index = SessionIndex()
+    slots = semaphore.Semaphore(CONF.rax_admin_fanout_concurrency)
+
+    def collect(node):
+        try:
+            return node, _node_sessions(req, node, slots, refresh), None
+        except Exception as e:
+            LOG.warning('Unable to collect sessions of node %(node)s: '
+                        '%(error)s', {'node': node['id'], 'error': e})
+            return node, None, str(e)
+
+    pool = eventlet.GreenPool(CONF.rax_admin_fanout_concurrency)
+    for node, volumes, error in pool.imap(collect, nodes):
+        if error is None:
+            index.add_node(node['id'], volumes)
+        else:
+            index.errors[node['id']] = error
+    return index
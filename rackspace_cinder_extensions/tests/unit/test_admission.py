@@ -0,0 +1,60 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+from eventlet import event
+import webob
+from webob import exc
+
+from rackspace_cinder_extensions.common import admission
+from rackspace_cinder_extensions import test
+
+
+class Controller(object):
+
+    def __init__(self):
+        self.release = event.Event()
+
+    @admission.limited('top-usage')
+    def top_usage(self, req):
+        self.release.wait()
+        return 'done'
+
+
+class AdmissionTestCase(test.TestCase):
+
+    def setUp(self):
+        super(AdmissionTestCase, self).setUp()
+        self.flags(rax_admin_action_limits={'top-usage': '1'},
+                   rax_admin_action_queue_size=0,
+                   rax_admin_retry_after=7)
+        self.addCleanup(admission._gates.clear)
+
+    def test_full_gate_sheds_with_retry_after(self):
+        controller = Controller()
+        running = eventlet.spawn(controller.top_usage,
+                                 webob.Request.blank('/'))
+        eventlet.sleep(0)
+        self.assertEqual(1, admission.stats()['top-usage']['in_flight'])
+
+        e = self.assertRaises(exc.HTTPTooManyRequests, controller.top_usage,
+                              webob.Request.blank('/'))
+        self.assertEqual('7', e.headers['Retry-After'])
+        self.assertEqual(1, admission.stats()['top-usage']['shed'])
+
+        controller.release.send()
+        self.assertEqual('done', running.wait())
+        self.assertEqual('done',
+                         controller.top_usage(webob.Request.blank('/')))
+        self.assertEqual(0, admission.stats()['top-usage']['in_flight'])
@@ -0,0 +1,158 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions import test
+
+
+class FakeMemcache(object):
+    """The part of memcache.Client the cache uses, over one dict shared
+    by every client like a memcached server
+    """
+    def __init__(self, data):
+        self.data = data
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    def set(self, key, value, time=0):
+        self.data[key] = value
+        return True
+
+    def add(self, key, value, time=0):
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        if key not in self.data:
+            return None
+        self.data[key] += 1
+        return self.data[key]
+
+    def delete(self, key):
+        self.data.pop(key, None)
+        return True
+
+
+class CacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CacheTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.flags(rax_cache_dir=self.path)
+        self.addCleanup(cache._caches.clear)
+
+    def test_memory_backend_is_per_process(self):
+        self.assertIsInstance(cache.get_cache(cache.EXPORT_SESSIONS),
+                              cache.TTLCache)
+
+    def test_file_backend_shares_entries(self):
+        self.flags(rax_cache_backend='file')
+        sessions = cache.get_cache(cache.EXPORT_SESSIONS)
+        self.assertIsInstance(sessions, cache.FileCache)
+        sessions.set('volume', [{'initiator_ip': '10.0.0.1'}], 30)
+        # another worker opens the same directory
+        other = cache.FileCache(cache.EXPORT_SESSIONS, self.path, 10)
+        self.assertEqual([{'initiator_ip': '10.0.0.1'}], other.get('volume'))
+        cache.invalidate_volume('volume')
+        self.assertIsNone(other.get('volume'))
+
+    @mock.patch('time.time')
+    def test_file_backend_expires(self, now):
+        now.return_value = 1000.0
+        nodes = cache.FileCache(cache.LUNR_NODES, self.path, 10)
+        nodes.set(('url', 'node'), {'id': 'node'}, 60)
+        self.assertEqual({'id': 'node'}, nodes.get(('url', 'node')))
+        now.return_value = 1061.0
+        self.assertIsNone(nodes.get(('url', 'node')))
+
+    def test_policy_decisions_stay_local(self):
+        self.flags(rax_cache_backend='file')
+        self.assertIsInstance(cache.get_cache(cache.POLICY_DECISIONS),
+                              cache.TTLCache)
+
+    @mock.patch('time.time')
+    def test_file_backend_purge_by_mtime(self, now):
+        now.return_value = 1000.0
+        nodes = cache.FileCache(cache.LUNR_NODES, self.path, 10)
+        for ttl in (10, 30, 40, 50):
+            nodes.set(ttl, ttl, ttl)
+        nodes.max_entries = 2
+        # the purge only looks at the mtime of the files
+        with open(nodes._file(40), 'w') as f:
+            f.write('not json')
+        os.utime(nodes._file(40), (1040.0, 1040.0))
+        now.return_value = 1020.0
+        nodes._purge()
+        self.assertEqual(2, len(nodes))
+        self.assertIsNone(nodes.get(30))
+        self.assertEqual(50, nodes.get(50))
+        self.assertTrue(os.path.exists(nodes._file(40)))
+
+    def _memcached(self, data):
+        client = FakeMemcache(data)
+        with mock.patch.object(cache, 'memcache') as memcache:
+            memcache.Client.return_value = client
+            return cache.MemcachedCache(cache.EXPORT_SESSIONS,
+                                        ['127.0.0.1:11211']), client
+
+    @mock.patch('time.time')
+    def test_memcached_backend_generation(self, now):
+        now.return_value = 1000.0
+        data = {}
+        first, first_client = self._memcached(data)
+        second, second_client = self._memcached(data)
+        first.set('volume', ['10.0.0.1'], 30)
+        self.assertEqual(['10.0.0.1'], second.get('volume'))
+        # the generation is remembered between operations
+        gets = second_client.gets
+        self.assertEqual(['10.0.0.1'], second.get('volume'))
+        self.assertEqual(gets + 1, second_client.gets)
+
+        first.clear()
+        self.assertIsNone(first.get('volume'))
+        # the other worker sees the clear once its generation expires
+        self.assertEqual(['10.0.0.1'], second.get('volume'))
+        now.return_value = 1000.0 + cache.MemcachedCache.generation_ttl + 1
+        self.assertIsNone(second.get('volume'))
+
+    @mock.patch('time.time')
+    def test_memcached_backend_lost_add(self, now):
+        now.return_value = 1000.0
+        data = {}
+        first, client = self._memcached(data)
+        get = client.get
+
+        def racing_get(key):
+            value = get(key)
+            if value is None and key.endswith(':generation'):
+                # another worker creates the generation first
+                data[key] = 7
+            return value
+        client.get = racing_get
+        first.set('volume', 'sessions', 30)
+        self.assertEqual(7, first._generation)
+        second, _ = self._memcached(data)
+        self.assertEqual('sessions', second.get('volume'))
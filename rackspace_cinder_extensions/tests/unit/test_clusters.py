@@ -0,0 +1,54 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+import webob
+
+from lunrclient.base import LunrError, LunrHttpError
+
+from rackspace_cinder_extensions.common import clusters
+from rackspace_cinder_extensions import test
+
+
+class FanOutTestCase(test.TestCase):
+
+    def setUp(self):
+        super(FanOutTestCase, self).setUp()
+        self.flags(lunr_clusters={'east': 'http://east:8080',
+                                  'north': 'http://north:8080',
+                                  'south': 'http://south:8080',
+                                  'west': 'http://west:8080'},
+                   lunr_cluster_timeout=0.05)
+        self.req = webob.Request.blank('/')
+
+    def test_partial_results_with_cluster_errors(self):
+        def call(client):
+            if client.url == 'http://east:8080':
+                return [{'id': 'node-1'}]
+            if client.url == 'http://north:8080':
+                raise LunrHttpError('unavailable', 503)
+            if client.url == 'http://south:8080':
+                # connection refused, a bare LunrError has no code
+                raise LunrError('connection refused')
+            eventlet.sleep(1)
+
+        results, errors = clusters.fan_out(self.req, call)
+        self.assertEqual([('east', [{'id': 'node-1'}])], results)
+        self.assertEqual(503, errors['north']['code'])
+        self.assertEqual(502, errors['south']['code'])
+        self.assertEqual(504, errors['west']['code'])
+
+        merged = clusters.merge(results, errors)
+        self.assertEqual(206, merged.code)
+        self.assertEqual('east', merged[0]['cluster'])
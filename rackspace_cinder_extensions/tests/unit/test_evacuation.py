@@ -0,0 +1,130 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import evacuation
+from rackspace_cinder_extensions.common import jobs
+from rackspace_cinder_extensions import test
+
+
+class EvacuationTestCase(test.TestCase):
+
+    def setUp(self):
+        super(EvacuationTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.addCleanup(cache._caches.clear)
+        self.store = jobs.JobStore(self.path)
+        self.volumes = {'vol-1': {'status': 'in-use', 'previous_status': None,
+                                  'host': 'old@lunr#lunr'}}
+
+        def volume_get(context, volume_id):
+            return dict(self.volumes[volume_id])
+
+        def volume_update(context, volume_id, values):
+            self.volumes[volume_id].update(values)
+
+        for name, func in (('volume_get', volume_get),
+                           ('volume_update', volume_update)):
+            patcher = mock.patch.object(evacuation.db, name,
+                                        side_effect=func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(evacuation, 'LunrClient')
+        self.lunr_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        # run the evacuation in the foreground
+        patcher = mock.patch.object(evacuation.eventlet, 'spawn_n',
+                                    side_effect=lambda func: func())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create(self, target_cinder_host='new@lunr#lunr'):
+        job = self.store.create(evacuation.KIND, source_node_id='source',
+                                target_node_id='target',
+                                target_cinder_host=target_cinder_host,
+                                target_hostname='target', target_port=8081,
+                                concurrency=2, rename=None,
+                                volumes={'vol-1': {'steps': [],
+                                                   'status': 'pending'}})
+        return job['id']
+
+    def _assert_evacuated(self, job_id, host='new@lunr#lunr'):
+        job = evacuation.Evacuation.load(job_id, self.store)
+        self.assertEqual('completed', job.job['status'])
+        self.assertEqual(list(evacuation.STEPS),
+                         job.job['volumes']['vol-1']['steps'])
+        self.assertEqual({'status': 'in-use', 'previous_status': 'maintenance',
+                          'migration_status': None,
+                          'host': host}, self.volumes['vol-1'])
+        self.lunr_client.volumes.update_vol_node_id.assert_called_once_with(
+            'vol-1', 'target')
+        self.assertIsNone(job.progress()['owner'])
+        self.assertFalse(os.path.exists(self.store._log_file(job_id)))
+
+    def test_resume_after_each_step(self):
+        for step in evacuation.STEPS:
+            self.volumes['vol-1'].update(status='in-use', previous_status=None,
+                                         host='old@lunr#lunr')
+            self.lunr_client.reset_mock()
+            job_id = self._create()
+            method = '_' + step
+            with mock.patch.object(evacuation.Evacuation, method,
+                                   side_effect=Exception('boom')):
+                job = evacuation.Evacuation.load(job_id, self.store)
+                self.assertTrue(job.start())
+            progress = evacuation.Evacuation.load(job_id,
+                                                  self.store).progress()
+            self.assertEqual('failed', progress['status'])
+            self.assertEqual([{'id': 'vol-1', 'step': step, 'msg': 'boom'}],
+                             progress['failures'])
+            self.assertTrue(evacuation.Evacuation.load(
+                job_id, self.store).start())
+            self._assert_evacuated(job_id)
+
+    def test_resume_abandoned_job(self):
+        job_id = self._create()
+        # the worker running it died after putting the volume in
+        # maintenance, before it could checkpoint that step
+        self.volumes['vol-1'].update(status='maintenance',
+                                     previous_status='in-use')
+        self.assertTrue(self.store.acquire(job_id))
+        self.store.checkpoint(job_id, {'id': 'vol-1', 'state': {
+            'steps': [], 'status': 'running'}})
+        job = evacuation.Evacuation.load(job_id, self.store)
+        self.assertFalse(job.start())
+        self.assertEqual('running', job.job['volumes']['vol-1']['status'])
+
+        stale = time.time() - jobs.CONF.rax_admin_job_lease_ttl - 1
+        os.utime(self.store._lock_file(job_id), (stale, stale))
+        self.assertTrue(job.start())
+        self._assert_evacuated(job_id)
+
+    def test_update_hostname_keeps_backend_and_pool(self):
+        self.volumes['vol-1']['host'] = 'old@lunr#pool2'
+        job_id = self._create(target_cinder_host='new')
+        self.assertTrue(evacuation.Evacuation.load(job_id, self.store).start())
+        self._assert_evacuated(job_id, host='new@lunr#pool2')
+
+        self.assertEqual('new@lunr#lunr', evacuation._rehost('old@lunr#lunr',
+                                                             'new@other#x'))
+        self.assertEqual('new@other#x', evacuation._rehost('old',
+                                                           'new@other#x'))
@@ -0,0 +1,68 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+import mock
+import webob
+
+from lunrclient.base import LunrError
+
+from rackspace_cinder_extensions.common import health
+from rackspace_cinder_extensions.common import records
+from rackspace_cinder_extensions import test
+
+
+class ProbeTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ProbeTestCase, self).setUp()
+        self.flags(rax_node_health_timeout=0.1)
+        self.req = webob.Request.blank('/')
+
+    @mock.patch('rackspace_cinder_extensions.common.memo.storage_client')
+    def test_probe_maps_errors_and_timeouts(self, storage_client):
+        def status(req, url, timeout):
+            client = mock.Mock()
+            if url == 'http://slow:8081':
+                client.status.list.side_effect = lambda: eventlet.sleep(1)
+            elif url == 'http://down:8081':
+                client.status.list.side_effect = LunrError('refused')
+            else:
+                client.status.list.return_value = {
+                    'volumes': {'vg_free': 10, 'vg_size': 20,
+                                'volume_count': 3},
+                    'exports': {'exports': 2}}
+            return client
+        storage_client.side_effect = status
+        nodes = [records.Record({'id': name, 'hostname': name, 'port': 8081})
+                 for name in ('up', 'slow', 'down')]
+        nodes.append(records.Record({'id': 'new', 'hostname': None}))
+
+        up, slow, down, new = [node['health']
+                               for node in health.probe(self.req, nodes)]
+        self.assertTrue(up['responded'])
+        self.assertEqual((10, 20, 3, 2),
+                         (up['free_space'], up['total_space'],
+                          up['volume_count'], up['export_count']))
+        self.assertEqual({'responded': False,
+                          'error': 'timed out after 0.1s'}, slow)
+        self.assertEqual({'responded': False, 'error': 'refused'}, down)
+        self.assertEqual({'responded': False,
+                          'error': 'no storage node address'}, new)
+
+    def test_probe_deadline(self):
+        self.flags(rax_node_health_deadline=0)
+        node = records.Record({'id': 'up', 'hostname': 'up', 'port': 8081})
+        self.assertEqual({'responded': False, 'error': 'deadline exceeded'},
+                         health.probe(self.req, [node])[0]['health'])
@@ -0,0 +1,50 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import datetime
+
+from cinder import context
+from cinder import db
+
+from rackspace_cinder_extensions.common import inventory
+from rackspace_cinder_extensions import test
+
+
+class InventoryTestCase(test.TestCase):
+
+    def setUp(self):
+        super(InventoryTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.selection = [('volumes', ['id', 'status'])]
+
+    def _volume(self, volume_id, created_at, **values):
+        return db.volume_create(self.context, dict(
+            values, id=volume_id, size=1, host='lunr@lunr#lunr',
+            created_at=created_at))
+
+    def test_incremental_export(self):
+        since = datetime.datetime(2016, 1, 1)
+        before = since - datetime.timedelta(days=1)
+        after = since + datetime.timedelta(days=1)
+        self._volume('old', before)
+        self._volume('created', after)
+        self._volume('updated', before)
+        db.volume_update(self.context, 'updated', {'status': 'in-use'})
+        self._volume('deleted', before)
+        db.volume_destroy(self.context, 'deleted')
+
+        ids = [r['id'] for r in inventory.records(self.selection, since)]
+        self.assertEqual(['created', 'deleted', 'updated'], ids)
+        ids = [r['id'] for r in inventory.records(self.selection)]
+        self.assertEqual(['created', 'old', 'updated'], ids)
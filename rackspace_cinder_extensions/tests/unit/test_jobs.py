@@ -0,0 +1,106 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from rackspace_cinder_extensions.common import jobs
+from rackspace_cinder_extensions.common import records
+from rackspace_cinder_extensions import test
+
+
+class JobsTestCase(test.TestCase):
+
+    def setUp(self):
+        super(JobsTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.store = jobs.JobStore(self.path)
+        for name, value in (('_pool', None), ('_next_purge', 0)):
+            patcher = mock.patch.object(jobs, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _submit(self, func):
+        job = jobs.submit('top-usage', func, self.store)
+        jobs._pool.waitall()
+        return self.store.load(job['id'])
+
+    def test_submit_and_page_result(self):
+        result = {'quotas': [{'id': i} for i in range(5)],
+                  'volumes': records.Envelope([{'id': 'a'}, {'id': 'b'}],
+                                              cluster='east'),
+                  'generated': 'now'}
+        job = self._submit(lambda: result)
+        self.assertEqual('completed', job['status'])
+        self.assertIsNone(self.store.lease(job['id']))
+
+        page, totals = self.store.load_result(job['id'], 3, 2)
+        self.assertEqual({'quotas': 5, 'volumes': 2}, totals)
+        self.assertEqual([{'id': 3}, {'id': 4}], page['quotas'])
+        self.assertEqual([], page['volumes'])
+        self.assertEqual('now', page['generated'])
+        page, totals = self.store.load_result(job['id'], 0, 1)
+        self.assertEqual([{'id': 'a', 'cluster': 'east'}], page['volumes'])
+        page, totals = self.store.load_result(job['id'])
+        self.assertEqual(5, len(page['quotas']))
+
+    def test_failed_job(self):
+        def fail():
+            raise ValueError('boom')
+        job = self._submit(fail)
+        self.assertEqual('failed', job['status'])
+        self.assertEqual('boom', job['error'])
+        self.assertRaises(jobs.JobNotFound, self.store.load_result, job['id'])
+
+    def test_pool_full(self):
+        self.flags(rax_admin_async_pool_size=1)
+        jobs.submit('top-usage', lambda: {}, self.store)
+        self.assertRaises(jobs.PoolFull, jobs.submit, 'top-usage',
+                          lambda: {}, self.store)
+        jobs._pool.waitall()
+
+    @mock.patch('time.time')
+    def test_expired_jobs_purged(self, now):
+        now.return_value = 1000.0
+        self.flags(rax_admin_job_ttl=60, rax_admin_job_purge_interval=30)
+        job = self._submit(lambda: {'quotas': []})
+        self.assertEqual(1060.0, job['expires'])
+        now.return_value = 1070.0
+        # the purge runs again once rax_admin_job_purge_interval passed
+        self._submit(lambda: {})
+        self.assertEqual([], [name for name in os.listdir(self.path)
+                              if name.startswith(job['id'])])
+
+    def test_abandoned_job_expires(self):
+        self.flags(rax_admin_job_ttl=60)
+        job = self.store.create('top-usage', result_ttl=60)
+        job['status'] = 'running'
+        self.store.save(job)
+        self.assertTrue(self.store.acquire(job['id']))
+        self.assertEqual('running', self.store.load(job['id'])['status'])
+
+        # the worker died, its lease and the job went stale
+        stale = time.time() - jobs.CONF.rax_admin_job_lease_ttl - 1
+        for path in (self.store._lock_file(job['id']),
+                     self.store._file(job['id'])):
+            os.utime(path, (stale, stale))
+        job = self.store.load(job['id'])
+        self.assertEqual('failed', job['status'])
+        self.assertEqual('abandoned by its api worker', job['error'])
+        self.assertTrue(job['expires'] <= time.time() + 60)
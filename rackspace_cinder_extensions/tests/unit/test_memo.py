@@ -0,0 +1,116 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+import mock
+import webob
+
+from lunrclient.base import LunrHttpError, ResponseDict
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import memo
+from rackspace_cinder_extensions import test
+
+
+class RequestMemoTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RequestMemoTestCase, self).setUp()
+        self.req = webob.Request.blank('/')
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_reads_fetched_once(self, get):
+        get.return_value = ResponseDict({'id': 'node'}, 200)
+        lunr_client = memo.lunr_client(self.req)
+        self.assertEqual({'id': 'node'}, lunr_client.nodes.get('node'))
+        self.assertEqual({'id': 'node'},
+                         memo.lunr_client(self.req).nodes.get('node'))
+        get.assert_called_once_with('node')
+        self.assertEqual(1, memo.get_memo(self.req).hits)
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_http_errors_remembered(self, get):
+        get.side_effect = LunrHttpError('missing', 404)
+        lunr_client = memo.lunr_client(self.req)
+        self.assertRaises(LunrHttpError, lunr_client.nodes.get, 'node')
+        self.assertRaises(LunrHttpError, lunr_client.nodes.get, 'node')
+        self.assertEqual(1, get.call_count)
+
+    @mock.patch('lunrclient.lunr.LunrNode.update')
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_writes_invalidate(self, get, update):
+        get.return_value = ResponseDict({'id': 'node'}, 200)
+        lunr_client = memo.lunr_client(self.req)
+        lunr_client.nodes.get('node')
+        lunr_client.nodes.update('node', status='ACTIVE')
+        lunr_client.nodes.get('node')
+        self.assertEqual(2, get.call_count)
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_transient_errors_not_remembered(self, get):
+        get.side_effect = [LunrHttpError('unavailable', 503),
+                           ResponseDict({'id': 'node'}, 200)]
+        lunr_client = memo.lunr_client(self.req)
+        self.assertRaises(LunrHttpError, lunr_client.nodes.get, 'node')
+        self.assertEqual({'id': 'node'}, lunr_client.nodes.get('node'))
+        self.assertEqual(2, get.call_count)
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_timed_out_read_not_left_pending(self, get):
+        def slow(node_id):
+            eventlet.sleep(1)
+        get.side_effect = slow
+        lunr_client = memo.lunr_client(self.req)
+        with eventlet.Timeout(0.01, False):
+            lunr_client.nodes.get('node')
+        get.side_effect = None
+        get.return_value = ResponseDict({'id': 'node'}, 200)
+        with eventlet.Timeout(1):
+            self.assertEqual({'id': 'node'}, lunr_client.nodes.get('node'))
+        self.assertEqual(2, get.call_count)
+
+
+class CachedNodeTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CachedNodeTestCase, self).setUp()
+        self.addCleanup(cache._caches.clear)
+        self.req = webob.Request.blank('/')
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_cached_node_and_forget_node(self, get):
+        get.return_value = ResponseDict({'id': 'node'}, 200)
+        lunr_client = memo.lunr_client(self.req)
+        self.assertEqual({'id': 'node'}, memo.cached_node(lunr_client, 'node'))
+        # another request is served from the lunr-nodes cache
+        other = memo.lunr_client(webob.Request.blank('/'))
+        node = memo.cached_node(other, 'node')
+        self.assertEqual({'id': 'node'}, node)
+        self.assertEqual(200, node.get_code())
+        get.assert_called_once_with('node')
+
+        cache.get_cache(cache.SESSION_TOPOLOGY).set('node', {}, 30)
+        memo.forget_node(other, 'node')
+        self.assertIsNone(cache.get_cache(cache.SESSION_TOPOLOGY).get('node'))
+        memo.cached_node(memo.lunr_client(webob.Request.blank('/')), 'node')
+        self.assertEqual(2, get.call_count)
+
+    @mock.patch('lunrclient.lunr.LunrNode.get')
+    def test_cached_node_errors_not_cached(self, get):
+        get.side_effect = LunrHttpError('missing', 404)
+        for _ in range(2):
+            self.assertRaises(LunrHttpError, memo.cached_node,
+                              memo.lunr_client(webob.Request.blank('/')),
+                              'node')
+        self.assertEqual(2, get.call_count)
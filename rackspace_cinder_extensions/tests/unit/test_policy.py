@@ -0,0 +1,62 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import mock
+
+from cinder import context
+from cinder import exception
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import policy
+from rackspace_cinder_extensions import test
+
+
+class SoftAuthorizerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SoftAuthorizerTestCase, self).setUp()
+        self.flags(rax_policy_cache_ttl=300)
+        self.addCleanup(cache._caches.clear)
+        patcher = mock.patch.dict(policy._state, path=None, mtime=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('cinder.api.extensions.extension_authorizer')
+        self.hard_authorize = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.authorize = policy.soft_extension_authorizer(
+            'volume', 'volume_list_admin_context')
+        self.context = context.RequestContext('user', 'project',
+                                              roles=['member'])
+
+    @mock.patch('time.time')
+    def test_decision_cached_until_ttl(self, now):
+        now.return_value = 1000.0
+        self.assertTrue(self.authorize(self.context))
+        self.hard_authorize.side_effect = exception.NotAuthorized()
+        # cache hit, the policy isn't asked again
+        self.assertTrue(self.authorize(self.context))
+        self.assertEqual(1, self.hard_authorize.call_count)
+
+        now.return_value = 1301.0
+        self.assertFalse(self.authorize(self.context))
+        self.assertEqual(2, self.hard_authorize.call_count)
+
+    def test_decision_per_roles(self):
+        self.hard_authorize.side_effect = exception.NotAuthorized()
+        self.assertFalse(self.authorize(self.context))
+        self.hard_authorize.side_effect = None
+        admin = context.RequestContext('user', 'project', roles=['admin'])
+        self.assertTrue(self.authorize(admin))
+        self.assertFalse(self.authorize(self.context))
+        self.assertEqual(2, self.hard_authorize.call_count)
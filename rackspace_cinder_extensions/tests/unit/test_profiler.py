@@ -0,0 +1,115 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import os
+import shutil
+import tempfile
+
+import eventlet
+from eventlet import event
+import mock
+import webob
+
+from rackspace_cinder_extensions.common import profiler
+from rackspace_cinder_extensions import test
+
+
+class Controller(object):
+
+    def __init__(self):
+        self.release = None
+
+    @profiler.profiled('outer')
+    def outer(self, req):
+        return self.inner(req)
+
+    @profiler.profiled('inner')
+    def inner(self, req):
+        if self.release is not None:
+            self.release.wait()
+        return 'done'
+
+
+class ProfilerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ProfilerTestCase, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.flags(rax_profile_dir=self.path, rax_profile_sample_rate=0.0)
+        self.controller = Controller()
+        self.requests = 0
+
+    def _req(self, header=None):
+        self.requests += 1
+        req = webob.Request.blank('/')
+        req.environ['cinder.context'] = mock.Mock(
+            request_id='req-%d' % self.requests)
+        if header is not None:
+            req.headers[profiler.HEADER] = header
+        return req
+
+    def _profiles(self):
+        return sorted(os.listdir(self.path))
+
+    @mock.patch('random.random')
+    def test_sample_rate(self, random):
+        self.flags(rax_profile_sample_rate=0.5)
+        random.return_value = 0.7
+        self.assertEqual('done', self.controller.inner(self._req()))
+        self.assertEqual([], self._profiles())
+        random.return_value = 0.3
+        self.assertEqual('done', self.controller.inner(self._req()))
+        self.assertEqual(1, len(self._profiles()))
+        self.assertTrue(self._profiles()[0].endswith('-inner-req-2.prof'))
+
+    @mock.patch.object(profiler, 'authorize_profile')
+    def test_header_needs_policy(self, authorize_profile):
+        authorize_profile.return_value = False
+        self.controller.inner(self._req('true'))
+        self.assertEqual([], self._profiles())
+        authorize_profile.return_value = True
+        self.controller.inner(self._req('false'))
+        self.assertEqual([], self._profiles())
+        self.controller.inner(self._req('true'))
+        self.assertEqual(1, len(self._profiles()))
+
+    def test_retention(self):
+        self.flags(rax_profile_sample_rate=1.0, rax_profile_retention=2)
+        for _ in range(3):
+            self.controller.inner(self._req())
+        profiles = self._profiles()
+        self.assertEqual(2, len(profiles))
+        self.assertFalse([name for name in profiles if 'req-1.' in name])
+
+    def test_nested_and_concurrent_requests(self):
+        self.flags(rax_profile_sample_rate=1.0)
+        # only the outermost call of a request is profiled
+        self.assertEqual('done', self.controller.outer(self._req()))
+        self.assertEqual(1, len(self._profiles()))
+        self.assertIn('-outer-', self._profiles()[0])
+
+        # a second request while one is being profiled runs unprofiled
+        self.controller.release = event.Event()
+        profiled = eventlet.spawn(self.controller.inner, self._req())
+        eventlet.sleep(0)
+        other = Controller()
+        self.assertEqual('done', other.inner(self._req()))
+        self.assertEqual(1, len(self._profiles()))
+        self.controller.release.send()
+        self.assertEqual('done', profiled.wait())
+        self.assertEqual(2, len(self._profiles()))
+        # and profiling is available again once it is over
+        other.inner(self._req())
+        self.assertEqual(3, len(self._profiles()))
@@ -0,0 +1,309 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import datetime
+import shutil
+import tempfile
+
+import mock
+from oslo_utils import timeutils
+import webob
+from webob import exc
+
+from cinder import context
+from cinder import db
+from cinder.db.sqlalchemy.api import get_session
+from cinder.db.sqlalchemy import models
+from lunrclient.base import LunrError, LunrHttpError
+from lunrclient.base import ResponseDict, ResponseList
+
+from rackspace_cinder_extensions.api.contrib import rax_admin
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import jobs
+from rackspace_cinder_extensions.common import records
+from rackspace_cinder_extensions import test
+
+
+class RaxAdminTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RaxAdminTestCase, self).setUp()
+        self.controller = rax_admin.RaxAdminController()
+        self.context = context.get_admin_context()
+
+    def _req(self):
+        req = webob.Request.blank('/')
+        req.environ['cinder.context'] = self.context
+        return req
+
+    @mock.patch.object(rax_admin.QUOTAS, 'get_defaults')
+    def test_quota_summary(self, get_defaults):
+        get_defaults.return_value = {'gigabytes': 100}
+        session = get_session()
+        with session.begin():
+            # project: (in use, hard limit or None for the default)
+            for project, (in_use, limit) in {'half': (50, None),
+                                             'almost': (95, 100),
+                                             'over': (120, 100),
+                                             'unlimited': (10, -1)}.items():
+                session.add(models.QuotaUsage(
+                    project_id=project, resource='gigabytes',
+                    in_use=in_use, reserved=0))
+                if limit is not None:
+                    session.add(models.Quota(project_id=project,
+                                             resource='gigabytes',
+                                             hard_limit=limit))
+        body = {'quota-summary': {'thresholds': [0.9, 1.0], 'buckets': 2}}
+        summary = self.controller._quota_summary(self._req(), body=body)
+        self.assertEqual({'gigabytes': {
+            'in_use': 275, 'hard_limit': 300, 'projects': 4, 'unlimited': 1,
+            'above': {'0.9': 2, '1.0': 1},
+            # [0, 50%), [50%, 100%), at or over the limit
+            'histogram': [0, 2, 1]}}, summary['resources'])
+
+    def _quota_changes(self, since=None):
+        body = {'quota-usage-changes': {'since': since}}
+        return self.controller._quota_usage_changes(self._req(), body=body)
+
+    def test_quota_usage_changes(self):
+        now = datetime.datetime(2016, 1, 10, 12, 0)
+        timeutils.set_time_override(now)
+        self.addCleanup(timeutils.clear_time_override)
+        self.flags(rax_quota_changes_safety_lag=60)
+        session = get_session()
+        with session.begin():
+            session.add(models.Quota(
+                project_id='old', resource='gigabytes', hard_limit=100,
+                created_at=datetime.datetime(2016, 1, 1)))
+            session.add(models.Quota(
+                project_id='gone', resource='gigabytes', hard_limit=100,
+                created_at=datetime.datetime(2016, 1, 1),
+                deleted=True, deleted_at=datetime.datetime(2016, 1, 9)))
+            session.add(models.QuotaUsage(
+                project_id='new', resource='gigabytes', in_use=5,
+                reserved=0, created_at=datetime.datetime(2016, 1, 10, 11)))
+            # written by a transaction that may not be committed yet
+            session.add(models.QuotaUsage(
+                project_id='late', resource='gigabytes', in_use=1,
+                reserved=0, created_at=datetime.datetime(2016, 1, 1),
+                updated_at=datetime.datetime(2016, 1, 10, 11, 59, 30)))
+
+        # first poll, every live row
+        changes = self._quota_changes()
+        self.assertEqual(['old'], [q['project_id'] for q in changes['quotas']])
+        self.assertEqual(['late', 'new'],
+                         sorted(u['project_id']
+                                for u in changes['quota_usages']))
+        # the watermark stays behind the query, not the newest row
+        self.assertEqual('2016-01-10T11:59:00', changes['watermark'])
+
+        changes = self._quota_changes('2016-01-05T00:00:00Z')
+        self.assertEqual([{'project_id': 'gone', 'resource': 'gigabytes',
+                           'hard_limit': 100, 'deleted': True,
+                           'changed_at': '2016-01-09T00:00:00'}],
+                         changes['quotas'])
+        self.assertEqual(['late', 'new'],
+                         sorted(u['project_id']
+                                for u in changes['quota_usages']))
+
+        # the late row is returned again after the watermark
+        changes = self._quota_changes(changes['watermark'])
+        self.assertEqual([], changes['quotas'])
+        self.assertEqual(['late'], [u['project_id']
+                                    for u in changes['quota_usages']])
+
+    def test_quota_usage_changes_invalid_since(self):
+        for since in ('yesterday', 5, ['2016-01-01']):
+            self.assertRaises(exc.HTTPBadRequest, self._quota_changes, since)
+
+    @mock.patch('rackspace_cinder_extensions.common.evacuation.Evacuation')
+    def test_evacuate_node_invalid_concurrency(self, evacuation):
+        for concurrency in ('abc', [4], {}):
+            body = {'evacuate-node': {'source_node_id': 'source',
+                                      'target_node_id': 'target',
+                                      'concurrency': concurrency}}
+            self.assertRaises(exc.HTTPBadRequest,
+                              self.controller._evacuate_node, self._req(),
+                              body=body)
+        self.assertFalse(evacuation.create.called)
+
+        body['evacuate-node']['concurrency'] = '4'
+        self.controller._evacuate_node(self._req(), body=body)
+        evacuation.create.assert_called_once_with(
+            'source', 'target', concurrency=4, rename=None)
+        evacuation.create.return_value.start.assert_called_once_with(
+            concurrency=4)
+
+    def test_job_result_pages_each_list(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        self.flags(rax_admin_job_dir=path)
+        store = jobs.JobStore()
+        job = store.create('compare-volumes', result_ttl=60)
+        store.save_result(job['id'], {
+            'quotas': [{'id': i} for i in range(5)],
+            'volumes': records.Envelope([{'id': 'a'}, {'id': 'b'}]),
+            'generated': 'now'})
+        job['status'] = 'completed'
+        store.save(job)
+
+        def job_result(**kwargs):
+            body = {'job-result': dict(kwargs, id=job['id'])}
+            return self.controller._job_result(self._req(), body=body)
+        page = job_result(offset=0, limit=2)
+        self.assertEqual({'quotas': 5, 'volumes': 2}, page['totals'])
+        self.assertEqual({'quotas': 2, 'volumes': None}, page['next_offsets'])
+        self.assertEqual(2, len(page['quotas']))
+        self.assertEqual('now', page['generated'])
+        self.assertNotIn('total', page)
+
+        page = job_result(offset=4, limit=2)
+        self.assertEqual([{'id': 4}], page['quotas'])
+        self.assertEqual({'quotas': None, 'volumes': None},
+                         page['next_offsets'])
+
+        for kwargs in ({'offset': 'abc'}, {'limit': [1]}, {'offset': {}}):
+            self.assertRaises(exc.HTTPBadRequest, job_result, **kwargs)
+
+    @mock.patch('lunrclient.lunr.LunrBackup.list')
+    def test_list_backups_pages_with_marker(self, backups_list):
+        backups_list.return_value = ResponseList([
+            {'id': backup_id, 'created_at': '2016-01-0%dT00:00:00' % day}
+            for backup_id, day in (('c', 3), ('a', 1), ('b', 2), ('d', 3))],
+            200)
+        body = {'list-backups': {'volume_id': 'vol', 'limit': 2}}
+        page = self.controller._list_backups(self._req(), body=body)
+        self.assertEqual(['a', 'b'], [b['id'] for b in page['backups']])
+        self.assertEqual('b', page['next_marker'])
+        backups_list.assert_called_with(volume_id='vol')
+
+        body['list-backups']['marker'] = page['next_marker']
+        page = self.controller._list_backups(self._req(), body=body)
+        self.assertEqual(['c', 'd'], [b['id'] for b in page['backups']])
+        self.assertIsNone(page['next_marker'])
+
+        body['list-backups']['marker'] = 'missing'
+        self.assertRaises(exc.HTTPBadRequest, self.controller._list_backups,
+                          self._req(), body=body)
+
+
+class GetVolumesTestCase(test.TestCase):
+
+    def setUp(self):
+        super(GetVolumesTestCase, self).setUp()
+        self.flags(lunr_clusters={'east': 'http://east:8080',
+                                  'west': 'http://west:8080'})
+        self.addCleanup(cache._caches.clear)
+        self.controller = rax_admin.RaxAdminController()
+        # volume id: (cluster, node id)
+        self.lunr_volumes = {'vol-a': ('east', 'node-1'),
+                             'vol-b': ('east', 'node-2'),
+                             'vol-c': ('west', 'node-3')}
+        self.down = set()
+        for volume_id in self.lunr_volumes:
+            db.volume_create(context.get_admin_context(),
+                             {'id': volume_id, 'size': 1})
+        self.lunr_clients = {}
+        for cluster in ('east', 'west'):
+            self.lunr_clients[cluster] = self._lunr_client(cluster)
+        patcher = mock.patch(
+            'rackspace_cinder_extensions.common.clusters.lunr_client',
+            side_effect=lambda req, cluster, tenant_id='admin':
+                self.lunr_clients[cluster])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'rackspace_cinder_extensions.common.memo.storage_client',
+            side_effect=lambda req, url: self._storage_client(url))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _lunr_volume(self, volume_id):
+        return {'id': volume_id, 'node_id': self.lunr_volumes[volume_id][1]}
+
+    def _lunr_client(self, cluster):
+        client = mock.Mock(url='http://%s:8080' % cluster)
+
+        def get(volume_id):
+            if self.lunr_volumes.get(volume_id, (None,))[0] != cluster:
+                raise LunrHttpError('not found', 404)
+            return ResponseDict(self._lunr_volume(volume_id), 200)
+        client.volumes.get.side_effect = get
+        client.volumes.list.return_value = ResponseList(
+            [self._lunr_volume(volume_id) for volume_id, (name, _)
+             in sorted(self.lunr_volumes.items()) if name == cluster], 200)
+        client.nodes.get.side_effect = lambda node_id: ResponseDict(
+            {'id': node_id, 'hostname': node_id, 'port': 8081}, 200)
+        client.exports.get.side_effect = LunrHttpError('not found', 404)
+        client.backups.list.return_value = ResponseList([], 200)
+        return client
+
+    def _storage_client(self, url):
+        client = mock.Mock()
+        node_id = url.split('/')[2].split(':')[0]
+        if node_id in self.down:
+            client.volumes.list.side_effect = LunrError('connection refused')
+        else:
+            client.volumes.list.return_value = ResponseList(
+                [{'id': volume_id} for volume_id, (_, node)
+                 in self.lunr_volumes.items() if node == node_id], 200)
+        client.exports.get.side_effect = LunrHttpError('not found', 404)
+        client.backups.list.return_value = ResponseDict({}, 200)
+        return client
+
+    def _get_volumes(self, ids):
+        req = webob.Request.blank('/')
+        # a caller that isn't a cinder admin, the cinder rows are read with
+        # an admin context
+        req.environ['cinder.context'] = context.RequestContext(
+            'user', 'project', is_admin=False)
+        return self.controller._get_volumes(req, body={
+            'get-volumes': {'ids': ids}})
+
+    def test_small_batch_gets_each_volume(self):
+        result = self._get_volumes(['vol-c', 'vol-a'])
+        self.assertEqual(['vol-c', 'vol-a'],
+                         [v['lunr_volumes']['id'] for v in result['volumes']])
+        self.assertEqual(['west', 'east'],
+                         [v['cluster'] for v in result['volumes']])
+        self.assertEqual('vol-a', result['volumes'][1]['cinder_volumes']['id'])
+        self.assertEqual(200, result['volumes'][1]['storage_volumes']['code'])
+        self.assertEqual({}, result['errors'])
+        for client in self.lunr_clients.values():
+            self.assertFalse(client.volumes.list.called)
+            self.assertEqual(2, client.volumes.get.call_count)
+
+    def test_large_batch_lists_each_cluster(self):
+        self.flags(rax_admin_get_volumes_list_threshold=1)
+        result = self._get_volumes(['vol-a', 'vol-c'])
+        self.assertEqual(2, result['count'])
+        for client in self.lunr_clients.values():
+            client.volumes.list.assert_called_once_with()
+            self.assertFalse(client.volumes.get.called)
+
+    def test_unknown_ids_reported(self):
+        result = self._get_volumes(['vol-a', 'missing'])
+        self.assertEqual(['vol-a'],
+                         [v['lunr_volumes']['id'] for v in result['volumes']])
+        self.assertEqual(['missing'], result['not_found'])
+        self.assertEqual(404, result['errors']['missing']['code'])
+
+    def test_storage_node_down(self):
+        self.down.add('node-2')
+        result = self._get_volumes(['vol-a', 'vol-b'])
+        self.assertEqual(['vol-a'],
+                         [v['lunr_volumes']['id'] for v in result['volumes']])
+        self.assertEqual({'vol-b': {'code': 502,
+                                    'message': 'connection refused'}},
+                         result['errors'])
@@ -0,0 +1,57 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+from oslo_serialization import jsonutils
+
+from rackspace_cinder_extensions.common import records
+from rackspace_cinder_extensions import test
+
+
+class RecordsTestCase(test.TestCase):
+
+    def test_record_leaves_data_alone(self):
+        data = {'id': 'node', 'status': 'ACTIVE'}
+        record = records.Record(data, cluster='east')
+        self.assertEqual('east', record['cluster'])
+        self.assertIn('status', record)
+        self.assertIsNone(record.get('missing'))
+        self.assertEqual({'id': 'node', 'status': 'ACTIVE'}, data)
+        self.assertEqual({'id': 'node', 'status': 'ACTIVE', 'cluster': 'east'},
+                         record.to_dict())
+
+    def test_envelope_serializes_as_list(self):
+        envelope = records.Envelope([{'id': 'a'}, {'id': 'b'}], 206,
+                                    cluster='west')
+        self.assertEqual(2, len(envelope))
+        self.assertEqual('b', envelope[1]['id'])
+        body = jsonutils.loads(jsonutils.dumps({'nodes': envelope}))
+        self.assertEqual([{'id': 'a', 'cluster': 'west'},
+                          {'id': 'b', 'cluster': 'west'}], body['nodes'])
+
+    def test_chain_of_envelopes(self):
+        east = [{'id': 'a'}, {'id': 'b'}]
+        west = [{'id': 'c'}]
+        chain = records.Chain([records.Envelope(east, cluster='east'),
+                               records.Envelope([]),
+                               records.Envelope(west, cluster='west')])
+        envelope = records.Envelope(chain, 206)
+        self.assertEqual(3, len(envelope))
+        self.assertEqual('west', envelope[2]['cluster'])
+        self.assertEqual('b', envelope[-2]['id'])
+        self.assertRaises(IndexError, envelope.__getitem__, 3)
+        self.assertEqual(['b', 'c'], [r['id'] for r in envelope[1:]])
+        self.assertEqual(['east', 'east', 'west'],
+                         [r['cluster'] for r in envelope])
+        # the items of the clusters are left alone
+        self.assertEqual([{'id': 'a'}, {'id': 'b'}], east)
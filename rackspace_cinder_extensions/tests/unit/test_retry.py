@@ -0,0 +1,72 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import mock
+
+from lunrclient.base import LunrError, LunrHttpError
+
+from rackspace_cinder_extensions.common import retry
+from rackspace_cinder_extensions import test
+
+
+@mock.patch('time.sleep')
+class RetryTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RetryTestCase, self).setUp()
+        self.flags(lunr_read_retries=2)
+
+    def test_retries_transient_errors(self, sleep):
+        call = mock.Mock(side_effect=[LunrError('reset'),
+                                      LunrHttpError('oops', 503),
+                                      {'id': 'node'}])
+        self.assertEqual({'id': 'node'}, retry.call_with_retry(call, 'node'))
+        self.assertEqual(3, call.call_count)
+        self.assertEqual(2, sleep.call_count)
+
+    def test_does_not_retry_client_errors(self, sleep):
+        call = mock.Mock(side_effect=LunrHttpError('missing', 404))
+        self.assertRaises(LunrHttpError, retry.call_with_retry, call)
+        self.assertEqual(1, call.call_count)
+        self.assertFalse(sleep.called)
+
+    def test_does_not_retry_argument_errors(self, sleep):
+        call = mock.Mock(side_effect=LunrError(
+            "'node_id' is not an argument for method 'list'"))
+        self.assertRaises(LunrError, retry.call_with_retry, call)
+        self.assertEqual(1, call.call_count)
+        self.assertFalse(sleep.called)
+        self.assertFalse(retry.is_transient(LunrError(
+            "'id' is required argument for method 'create'")))
+
+    def test_gives_up_after_retries(self, sleep):
+        call = mock.Mock(side_effect=LunrError('reset'))
+        self.assertRaises(LunrError, retry.call_with_retry, call)
+        self.assertEqual(3, call.call_count)
+
+    def test_resilient_retries_and_counts(self, sleep):
+        self.flags(lunr_max_attempts=4, lunr_hedge_min_delay=5)
+        retries = retry.STATS['retries']
+        call = mock.Mock(side_effect=[LunrError('reset'), {'id': 'node'}])
+        self.assertEqual({'id': 'node'}, retry.call_resilient(call, 'node'))
+        self.assertEqual(2, call.call_count)
+        self.assertEqual(retries + 1, retry.STATS['retries'])
+
+    def test_resilient_gives_up_after_max_attempts(self, sleep):
+        self.flags(lunr_max_attempts=2, lunr_hedge_min_delay=5)
+        gave_up = retry.STATS['gave_up']
+        call = mock.Mock(side_effect=LunrError('reset'))
+        self.assertRaises(LunrError, retry.call_resilient, call)
+        self.assertEqual(2, call.call_count)
+        self.assertEqual(gave_up + 1, retry.STATS['gave_up'])
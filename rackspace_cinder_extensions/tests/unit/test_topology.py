@@ -0,0 +1,121 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import eventlet
+import mock
+import webob
+
+from lunrclient.base import LunrHttpError
+
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions.common import topology
+from rackspace_cinder_extensions import test
+
+
+class SessionIndexTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SessionIndexTestCase, self).setUp()
+        self.index = topology.SessionIndex()
+        self.index.add_node('node-1', {'vol-1': ['10.0.0.1'],
+                                       'vol-2': ['10.0.0.1', '10.0.0.2']})
+        self.index.add_node('node-2', {'vol-3': []})
+
+    def test_for_initiator(self):
+        self.assertEqual([
+            {'node_id': 'node-1', 'volume_id': 'vol-2',
+             'initiator_ip': '10.0.0.2'},
+        ], self.index.for_initiator('10.0.0.2'))
+        self.assertEqual(['vol-1', 'vol-2'],
+                         [s['volume_id'] for s
+                          in self.index.for_initiator('10.0.0.1')])
+
+    def test_for_node_and_volume(self):
+        self.assertEqual(3, len(self.index.for_node('node-1')))
+        self.assertEqual([], self.index.for_node('node-2'))
+        self.assertEqual([], self.index.for_volume('vol-3'))
+        self.assertEqual([], self.index.for_volume('missing'))
+        self.assertEqual('node-1',
+                         self.index.for_volume('vol-1')[0]['node_id'])
+
+
+class BuildIndexTestCase(test.TestCase):
+
+    def setUp(self):
+        super(BuildIndexTestCase, self).setUp()
+        self.flags(rax_admin_fanout_concurrency=3)
+        self.addCleanup(cache._caches.clear)
+        self.req = webob.Request.blank('/')
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _request(self, result):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            eventlet.sleep(0.001)
+            return result
+        finally:
+            self.in_flight -= 1
+
+    def _clients(self, lunr_client, storage_client):
+        lunr = mock.Mock()
+        lunr.volumes.list.side_effect = lambda node_id: self._request(
+            [{'id': '%s-vol-%d' % (node_id, i), 'status': 'ACTIVE'}
+             for i in range(5)])
+
+        def storage(req, url, timeout):
+            client = mock.Mock()
+
+            def get(volume_id):
+                if url == 'http://broken:8081':
+                    raise LunrHttpError('unavailable', 503)
+                if volume_id.endswith('-4'):
+                    self._request(None)
+                    raise LunrHttpError('not found', 404)
+                return self._request({'sessions': [{'ip': url}]})
+            client.exports.get.side_effect = get
+            return client
+
+        lunr_client.return_value = lunr
+        storage_client.side_effect = storage
+
+    @mock.patch('rackspace_cinder_extensions.common.memo.storage_client')
+    @mock.patch('rackspace_cinder_extensions.common.memo.lunr_client')
+    def test_requests_bounded_across_nodes(self, lunr_client,
+                                           storage_client):
+        self._clients(lunr_client, storage_client)
+        nodes = [{'id': 'node-%d' % i, 'hostname': 'node%d' % i,
+                  'port': 8081} for i in range(4)]
+        nodes.append({'id': 'broken', 'hostname': 'broken', 'port': 8081})
+        index = topology.build_index(self.req, nodes)
+        self.assertEqual(3, self.max_in_flight)
+        self.assertEqual(['broken'], list(index.errors))
+        self.assertEqual(16, len(index.by_volume))
+        self.assertEqual([], index.for_volume('node-0-vol-4'))
+        self.assertEqual(['node-2-vol-0', 'node-2-vol-1', 'node-2-vol-2',
+                          'node-2-vol-3'],
+                         [s['volume_id'] for s
+                          in index.for_initiator('http://node2:8081')])
+
+    @mock.patch('rackspace_cinder_extensions.common.memo.storage_client')
+    @mock.patch('rackspace_cinder_extensions.common.memo.lunr_client')
+    def test_node_sessions_cached(self, lunr_client, storage_client):
+        self._clients(lunr_client, storage_client)
+        nodes = [{'id': 'node-1', 'hostname': 'node1', 'port': 8081}]
+        topology.build_index(self.req, nodes)
+        topology.build_index(self.req, nodes)
+        self.assertEqual(1, lunr_client.return_value.volumes.list.call_count)
+        topology.build_index(self.req, nodes, refresh=True)
+        self.assertEqual(2, lunr_client.return_value.volumes.list.call_count)
@@ -0,0 +1,153 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import mock
+import webob
+from webob import exc
+
+from cinder import context
+from cinder import db
+from cinder.db.sqlalchemy import models
+from cinder import exception
+from lunrclient.base import LunrHttpError, ResponseDict
+
+from rackspace_cinder_extensions.api.contrib import volume_admin_interface
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions import test
+
+
+class RehostTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RehostTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.hosts = {'exact': 'lunr_1',
+                      'backend': 'lunr_1@lunr#pool',
+                      'pool': 'lunr_1#pool',
+                      # would match if _ were a LIKE wildcard
+                      'wildcard': 'lunrX1@lunr#pool',
+                      'prefix': 'lunr_10@lunr#pool',
+                      'other': 'lunr_2@lunr#pool',
+                      'deleted': 'lunr_1@lunr#pool'}
+        for volume_id, host in self.hosts.items():
+            db.volume_create(self.context, {'id': volume_id, 'host': host,
+                                            'size': 1})
+        db.volume_destroy(self.context, 'deleted')
+
+    def _hosts(self):
+        return dict((volume_id, db.volume_get(
+            self.context.elevated(read_deleted='yes'), volume_id)['host'])
+            for volume_id in self.hosts)
+
+    def test_dry_run_counts(self):
+        counts = volume_admin_interface._rehost(
+            self.context, [models.Volume], 'lunr_1', 'lunr-new',
+            dry_run=True)
+        self.assertEqual({'volumes': 3}, counts)
+        self.assertEqual(self.hosts, self._hosts())
+
+    def test_rehost_keeps_suffix(self):
+        counts = volume_admin_interface._rehost(
+            self.context, [models.Volume], 'lunr_1', 'lunr-new')
+        self.assertEqual({'volumes': 3}, counts)
+        expected = dict(self.hosts, exact='lunr-new',
+                        backend='lunr-new@lunr#pool', pool='lunr-new#pool')
+        self.assertEqual(expected, self._hosts())
+
+    def test_percent_is_literal(self):
+        db.volume_create(self.context, {'id': 'percent', 'size': 1,
+                                        'host': '10%@lunr#pool'})
+        counts = volume_admin_interface._rehost(
+            self.context, [models.Volume], '10%', 'lunr-new', dry_run=True)
+        self.assertEqual({'volumes': 1}, counts)
+        counts = volume_admin_interface._rehost(
+            self.context, [models.Volume], '1%', 'lunr-new', dry_run=True)
+        self.assertEqual({'volumes': 0}, counts)
+
+
+class UpdateNodeIdTestCase(test.TestCase):
+
+    def setUp(self):
+        super(UpdateNodeIdTestCase, self).setUp()
+        self.addCleanup(cache._caches.clear)
+        self.nodes = {'node-1': {'id': 'node-1'}, 'node-2': {'id': 'node-2'}}
+        self.lunr_client = mock.Mock()
+
+        def get_node(node_id):
+            if node_id not in self.nodes:
+                raise LunrHttpError('not found', 404)
+            return ResponseDict(self.nodes[node_id], 200)
+        self.lunr_client.nodes.get.side_effect = get_node
+        self.lunr_client.volumes.get.side_effect = lambda volume_id: \
+            ResponseDict({'id': volume_id, 'node_id': 'node-1'}, 200)
+        patcher = mock.patch(
+            'rackspace_cinder_extensions.common.memo.lunr_client',
+            return_value=self.lunr_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _req(self):
+        req = webob.Request.blank('/')
+        req.environ['cinder.context'] = context.RequestContext(
+            'user', 'project', is_admin=False)
+        return req
+
+    def test_update_node_id_looks_up_both_nodes(self):
+        controller = volume_admin_interface.VolumeAdminController()
+        with mock.patch.object(controller.volume_api, 'get',
+                               return_value={'id': 'vol'}):
+            controller._update_node_id(self._req(), 'vol',
+                                       body={'update_node_id': 'node-2'})
+            self.assertEqual(['node-1', 'node-2'],
+                             sorted(args[0] for args, _ in
+                                    self.lunr_client.nodes.get.call_args_list))
+            self.lunr_client.volumes.update_vol_node_id.\
+                assert_called_once_with('vol', 'node-2')
+
+            self.lunr_client.reset_mock()
+            self.assertRaises(exc.HTTPNotFound,
+                              controller._update_node_id, self._req(), 'vol',
+                              body={'update_node_id': 'node-3'})
+            self.assertFalse(
+                self.lunr_client.volumes.update_vol_node_id.called)
+
+    def test_bulk_update_node_id(self):
+        controller = volume_admin_interface.VolumeAdminBulkController()
+
+        def get(context, volume_id):
+            self.assertTrue(context.is_admin)
+            if volume_id == 'missing':
+                raise exception.VolumeNotFound(volume_id=volume_id)
+            return {'id': volume_id}
+        body = {'update_node_id': {'node_id': 'node-2',
+                                   'volume_ids': ['vol-1', 'missing',
+                                                  'vol-2']}}
+        with mock.patch.object(controller.volume_api, 'get',
+                               side_effect=get):
+            result = controller._update_node_id(self._req(), body=body)
+        self.assertEqual([('vol-1', 200), ('missing', 404), ('vol-2', 200)],
+                         [(v['id'], v['code']) for v in result['volumes']])
+        self.assertEqual(2, self.lunr_client.volumes.update_vol_node_id.
+                         call_count)
+        self.lunr_client.nodes.get.assert_called_once_with('node-2')
+
+    @mock.patch.object(volume_admin_interface, 'authorize_update_node_id',
+                       return_value=False)
+    def test_bulk_update_node_id_unauthorized(self, authorize):
+        controller = volume_admin_interface.VolumeAdminBulkController()
+        body = {'update_node_id': {'node_id': 'node-2',
+                                   'volume_ids': ['vol-1']}}
+        self.assertRaises(exc.HTTPForbidden, controller._update_node_id,
+                          self._req(), body=body)
+        self.assertFalse(self.lunr_client.method_calls)
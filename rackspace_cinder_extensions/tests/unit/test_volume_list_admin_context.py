@@ -66,3 +66,31 @@ class VolumeListAdminContextTestCase(test.TestCase):
                                         sort_dirs=mock.ANY,
                                         sort_keys=mock.ANY,
                                         viewable_admin_meta=mock.ANY)
+
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_authorized_keyset_paging(self, get_all):
+        self.flags(rax_all_tenants_max_limit=10)
+        ctx = context.RequestContext('admin', 'fake', False,
+                                     roles=self._authorized_roles)
+        req = webob.Request.blank('/v2/fake/volumes/detail'
+                                  '?all_tenants=1&limit=1000&sort=size')
+        res = req.get_response(fakes.wsgi_app(fake_auth_context=ctx))
+
+        self.assertEqual(200, res.status_int)
+        get_all.assert_called_once_with(mock.ANY, None, 10,
+                                        filters={'all_tenants': 1},
+                                        offset=mock.ANY,
+                                        sort_dirs=['desc', 'desc'],
+                                        sort_keys=['created_at', 'id'],
+                                        viewable_admin_meta=mock.ANY)
+
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_authorized_offset_rejected(self, get_all):
+        ctx = context.RequestContext('admin', 'fake', False,
+                                     roles=self._authorized_roles)
+        req = webob.Request.blank('/v2/fake/volumes/detail'
+                                  '?all_tenants=1&offset=5000')
+        res = req.get_response(fakes.wsgi_app(fake_auth_context=ctx))
+
+        self.assertEqual(400, res.status_int)
+        self.assertFalse(get_all.called)
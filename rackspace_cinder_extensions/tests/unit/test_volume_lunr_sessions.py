@@ -0,0 +1,155 @@
+#  Copyright 2013-2016 Rackspace US, Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License"); you may
+#  not use this file except in compliance with the License. You may obtain
+#  a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#  WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#  License for the specific language governing permissions and limitations
+#  under the License.
+
+import mock
+import webob
+
+from cinder import context
+from lunrclient.base import LunrHttpError, ResponseDict
+
+from rackspace_cinder_extensions.api.contrib import volume_lunr_sessions
+from rackspace_cinder_extensions.common import cache
+from rackspace_cinder_extensions import test
+
+
+class WantedTestCase(test.TestCase):
+
+    def setUp(self):
+        super(WantedTestCase, self).setUp()
+        self.controller = volume_lunr_sessions.VolumeLunrSessionsController()
+        patcher = mock.patch.object(self.controller, '_add_lunr_sessions')
+        self.add_lunr_sessions = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(volume_lunr_sessions, 'authorize',
+                                    return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _show(self, url='/', headers=None):
+        """Run the show extension around a volume show, return whether
+        it added the sessions
+        """
+        req = webob.Request.blank(url, headers=headers)
+        req.environ['cinder.context'] = context.RequestContext(
+            'user', 'project', is_admin=False)
+        self.add_lunr_sessions.reset_mock()
+        resp_obj = mock.Mock(obj={'volume': {'id': 'vol'}})
+        extension = self.controller.show(req, 'vol')
+        next(extension)
+        self.assertRaises(StopIteration, extension.send, resp_obj)
+        return self.add_lunr_sessions.called
+
+    def test_query_param(self):
+        self.assertTrue(self._show('/?lunr_sessions=true'))
+        self.assertTrue(self._show('/?lunr_sessions=1'))
+        self.assertFalse(self._show('/?lunr_sessions=false'))
+        self.assertFalse(self._show('/'))
+
+    def test_header(self):
+        self.assertTrue(self._show(headers={'X-Rax-Lunr-Sessions': 'true'}))
+        self.assertFalse(self._show(headers={'X-Rax-Lunr-Sessions': 'no'}))
+        # the query parameter wins over the header
+        self.assertFalse(self._show('/?lunr_sessions=false',
+                                    {'X-Rax-Lunr-Sessions': 'true'}))
+
+    def test_by_default(self):
+        self.flags(lunr_sessions_by_default=True)
+        self.assertTrue(self._show('/'))
+        self.assertFalse(self._show('/?lunr_sessions=false'))
+        self.assertFalse(self._show(headers={'X-Rax-Lunr-Sessions': 'off'}))
+
+    def test_invalid_values_are_false(self):
+        self.flags(lunr_sessions_by_default=True)
+        self.assertFalse(self._show('/?lunr_sessions=maybe'))
+        self.assertFalse(self._show('/?lunr_sessions='))
+        self.assertFalse(self._show(headers={'X-Rax-Lunr-Sessions': '2'}))
+
+    def test_unauthorized(self):
+        volume_lunr_sessions.authorize.return_value = False
+        self.assertFalse(self._show('/?lunr_sessions=true'))
+
+
+@mock.patch('time.time')
+class ExportSessionsCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ExportSessionsCacheTestCase, self).setUp()
+        self.flags(lunr_sessions_cache_ttl=30,
+                   lunr_sessions_cache_negative_ttl=5)
+        self.addCleanup(cache._caches.clear)
+        self.controller = volume_lunr_sessions.VolumeLunrSessionsController()
+        self.lunr_client = mock.Mock(url='http://lunr:8080')
+        self.lunr_client.volumes.get.return_value = ResponseDict(
+            {'id': 'vol', 'node_id': 'node'}, 200)
+        self.lunr_client.nodes.get.return_value = ResponseDict(
+            {'id': 'node', 'hostname': 'storage'}, 200)
+        self.storage_client = mock.Mock()
+        self.storage_client.exports.get.return_value = ResponseDict(
+            {'sessions': [{'ip': '10.0.0.1'}]}, 200)
+        for name, client in (('lunr_client', self.lunr_client),
+                             ('storage_client', self.storage_client)):
+            patcher = mock.patch(
+                'rackspace_cinder_extensions.common.memo.' + name,
+                return_value=client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _sessions(self):
+        req = webob.Request.blank('/')
+        req.get_db_volume = mock.Mock(return_value={'project_id': 'project'})
+        volume = {'id': 'vol'}
+        self.controller._add_lunr_sessions(req, volume)
+        return volume['rs-vol-lunr-sessions:sessions']
+
+    def test_sessions_cached_until_ttl(self, now):
+        now.return_value = 1000.0
+        self.assertEqual([{'initiator_ip': '10.0.0.1'}], self._sessions())
+        # cache hit, neither lunr nor the storage node are asked again
+        self.assertEqual([{'initiator_ip': '10.0.0.1'}], self._sessions())
+        self.assertEqual(1, self.storage_client.exports.get.call_count)
+        self.assertEqual(1, self.lunr_client.volumes.get.call_count)
+
+        now.return_value = 1031.0
+        self._sessions()
+        self.assertEqual(2, self.storage_client.exports.get.call_count)
+
+    def test_missing_export_cached_for_negative_ttl(self, now):
+        now.return_value = 1000.0
+        self.storage_client.exports.get.side_effect = LunrHttpError(
+            'not found', 404)
+        self.assertEqual([], self._sessions())
+        now.return_value = 1004.0
+        self.assertEqual([], self._sessions())
+        self.assertEqual(1, self.storage_client.exports.get.call_count)
+
+        # the volume got exported since, it shows once the short ttl passed
+        self.storage_client.exports.get.side_effect = None
+        now.return_value = 1006.0
+        self.assertEqual([{'initiator_ip': '10.0.0.1'}], self._sessions())
+        self.assertEqual(2, self.storage_client.exports.get.call_count)
+
+    def test_errors_not_cached(self, now):
+        now.return_value = 1000.0
+        self.storage_client.exports.get.side_effect = LunrHttpError(
+            'boom', 500)
+        self.assertEqual([], self._sessions())
+        self.storage_client.exports.get.side_effect = None
+        self.assertEqual([{'initiator_ip': '10.0.0.1'}], self._sessions())
+
+    def test_invalidate_volume(self, now):
+        now.return_value = 1000.0
+        self._sessions()
+        cache.invalidate_volume('vol', 'node')
+        self._sessions()
+        self.assertEqual(2, self.storage_client.exports.get.call_count)